@@ -7,14 +7,17 @@ import json
 import os
 import secrets
 import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
-from typing import List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 from urllib.parse import urlencode, urlparse
 
 from fastapi import HTTPException, status
+import google.auth.transport.requests
 import google.oauth2.credentials
 import google_auth_oauthlib.flow
-from googleapiclient.discovery import build
+from googleapiclient.discovery import build, build_from_document
+from googleapiclient.discovery_cache import get_static_doc
 from googleapiclient.errors import HttpError
 from pydantic import BaseModel
 
@@ -27,6 +30,7 @@ GOOGLE_REDIRECT_URI = os.getenv(
 )
 SCOPES = ["https://www.googleapis.com/auth/calendar.readonly", "https://www.googleapis.com/auth/calendar.events"]
 STATE_TOKEN_TTL_SECONDS = int(os.getenv("GOOGLE_STATE_TTL_SECONDS", "900"))
+SERVICE_CACHE_SIZE = max(0, int(os.getenv("GOOGLE_CALENDAR_SERVICE_CACHE_SIZE", "256")))
 STATE_SIGNING_SECRET = (
     os.getenv("GOOGLE_STATE_SECRET")
     or GOOGLE_CLIENT_SECRET
@@ -227,31 +231,128 @@ async def exchange_code_for_tokens(code: str, state: str, redirect_override: Opt
             detail=f"Failed to exchange authorization code: {str(e)}"
         )
 
-async def get_google_calendar_service(credentials: GoogleCalendarCredentials) -> any:
-    """Get Google Calendar service instance."""
-    try:
-        scopes = credentials.scopes
-        if isinstance(scopes, str):
-            try:
-                parsed = json.loads(scopes)
-                if isinstance(parsed, list):
-                    scopes = parsed
-            except json.JSONDecodeError:
-                scopes = [scope.strip() for scope in scopes.split() if scope.strip()]
-
-        # Create credentials object
+def _normalize_scopes(scopes: Any) -> List[str]:
+    if isinstance(scopes, str):
+        try:
+            parsed = json.loads(scopes)
+            if isinstance(parsed, list):
+                return parsed
+        except json.JSONDecodeError:
+            return [scope.strip() for scope in scopes.split() if scope.strip()]
+    return list(scopes or [])
+
+
+def _credentials_fingerprint(credentials: GoogleCalendarCredentials, scopes: List[str]) -> str:
+    material = json.dumps(
+        [
+            credentials.access_token,
+            credentials.refresh_token,
+            credentials.token_uri,
+            credentials.client_id,
+            credentials.client_secret,
+            sorted(scopes),
+        ]
+    )
+    return hashlib.sha256(material.encode()).hexdigest()
+
+
+class GoogleCalendarServiceCache:
+    """Reuse Calendar API clients across requests, keyed by user and token fingerprint."""
+
+    def __init__(self, max_entries: int) -> None:
+        self.max_entries = max_entries
+        self._document: Optional[Dict[str, Any]] = None
+        self._services: "OrderedDict[int, Tuple[str, Any]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _discovery_document(self) -> Optional[Dict[str, Any]]:
+        if self._document is None:
+            raw = get_static_doc("calendar", "v3")
+            if raw:
+                self._document = json.loads(raw)
+        return self._document
+
+    def _build(self, creds: google.oauth2.credentials.Credentials) -> Any:
+        document = self._discovery_document()
+        if document is None:
+            # No bundled document for this client version; fall back to the regular lookup.
+            return build("calendar", "v3", credentials=creds)
+        return build_from_document(document, credentials=creds)
+
+    def get(self, credentials: GoogleCalendarCredentials) -> Any:
+        scopes = _normalize_scopes(credentials.scopes) or SCOPES
+        fingerprint = _credentials_fingerprint(credentials, scopes)
+        cached = self._services.get(credentials.user_id)
+        if cached and cached[0] == fingerprint:
+            self.hits += 1
+            self._services.move_to_end(credentials.user_id)
+            return cached[1]
+
+        self.misses += 1
         creds = google.oauth2.credentials.Credentials(
             token=credentials.access_token,
             refresh_token=credentials.refresh_token,
             token_uri=credentials.token_uri,
             client_id=credentials.client_id,
             client_secret=credentials.client_secret,
-            scopes=scopes or SCOPES,
+            scopes=scopes,
+            expiry=credentials.expires_at,
         )
-
-        # Build calendar service
-        service = build('calendar', 'v3', credentials=creds)
+        service = self._build(creds)
+        if self.max_entries > 0:
+            self._services[credentials.user_id] = (fingerprint, service)
+            self._services.move_to_end(credentials.user_id)
+            while len(self._services) > self.max_entries:
+                self._services.popitem(last=False)
+                self.evictions += 1
         return service
+
+    def invalidate(self, user_id: int) -> None:
+        """Drop a user's cached client, e.g. after their tokens were replaced."""
+        if self._services.pop(user_id, None) is not None:
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._services),
+            "max_entries": self.max_entries,
+            "discovery_document_loaded": self._document is not None,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+SERVICE_CACHE = GoogleCalendarServiceCache(SERVICE_CACHE_SIZE)
+
+
+def refresh_google_credentials(credentials: GoogleCalendarCredentials) -> GoogleCalendarCredentials:
+    """Exchange the stored refresh token for a new access token (blocking)."""
+    creds = google.oauth2.credentials.Credentials(
+        token=credentials.access_token,
+        refresh_token=credentials.refresh_token,
+        token_uri=credentials.token_uri,
+        client_id=credentials.client_id,
+        client_secret=credentials.client_secret,
+        scopes=_normalize_scopes(credentials.scopes) or SCOPES,
+    )
+    creds.refresh(google.auth.transport.requests.Request())
+    return credentials.copy(
+        update={
+            "access_token": creds.token,
+            "refresh_token": creds.refresh_token or credentials.refresh_token,
+            "expires_at": creds.expiry or (datetime.utcnow() + timedelta(hours=1)),
+            "updated_at": datetime.utcnow(),
+        }
+    )
+
+
+async def get_google_calendar_service(credentials: GoogleCalendarCredentials) -> any:
+    """Get Google Calendar service instance."""
+    try:
+        return SERVICE_CACHE.get(credentials)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -1,24 +1,44 @@
-from fastapi import FastAPI, HTTPException, Depends, status, UploadFile, File, Form
+from fastapi import FastAPI, HTTPException, Depends, status, UploadFile, File, Form, Query, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, EmailStr
-from typing import Optional, List, Dict, Any, AsyncGenerator, Tuple
+from typing import Optional, List, Dict, Any, AsyncGenerator, Tuple, Callable, IO, Literal
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 import databases
 import sqlalchemy
-from datetime import datetime
+from sqlalchemy.dialects import postgresql as postgresql_dialect
+from sqlalchemy.dialects import sqlite as sqlite_dialect
+from datetime import date, datetime, timedelta, timezone
 import os
 import json
 import asyncio
+import base64
+import functools
+import hashlib
+import io
 import threading
-import tempfile
+import mimetypes
+import multiprocessing
 import time
+import random
 import re
+import sqlite3
+from collections import OrderedDict, deque
 from dotenv import load_dotenv
 import google.generativeai as genai
 from supabase import create_client, Client
-from pathlib import Path
+from media_preprocessing import (
+    downscale_image,
+    extract_inline_text,
+    image_preprocessing_available,
+    is_inline_text,
+    is_resizable_image,
+)
 from google_calendar import (
+    SERVICE_CACHE as GOOGLE_CALENDAR_SERVICES,
     GoogleCalendarCredentials,
     GoogleCalendarInfo,
     GoogleCalendarEvent,
@@ -29,18 +49,13 @@ from google_calendar import (
     exchange_code_for_tokens,
     get_google_calendar_service,
     list_google_calendars,
+    refresh_google_credentials,
     list_google_events,
     create_google_event
 )
 
 load_dotenv()
 
-# Database configuration
-DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./test.db")
-database = databases.Database(DATABASE_URL)
-metadata = sqlalchemy.MetaData()
-
-
 def _int_env(var_name: str, default: int) -> int:
     try:
         return int(os.getenv(var_name, default))
@@ -55,11 +70,182 @@ def _float_env(var_name: str, default: float) -> float:
         return default
 
 
+# Database configuration
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./test.db")
+DATABASE_POOL_MIN_SIZE = max(1, _int_env("DATABASE_POOL_MIN_SIZE", 1))
+DATABASE_POOL_MAX_SIZE = max(DATABASE_POOL_MIN_SIZE, _int_env("DATABASE_POOL_MAX_SIZE", 10))
+DATABASE_POOL_ACQUIRE_TIMEOUT = max(0.1, _float_env("DATABASE_POOL_ACQUIRE_TIMEOUT", 10.0))
+BATCH_MUTATION_MAX_OPERATIONS = max(1, _int_env("BATCH_MUTATION_MAX_OPERATIONS", 500))
+PAGINATION_MAX_PAGE_SIZE = max(1, _int_env("PAGINATION_MAX_PAGE_SIZE", 200))
+PAGINATION_DEFAULT_PAGE_SIZE = min(
+    PAGINATION_MAX_PAGE_SIZE, max(1, _int_env("PAGINATION_DEFAULT_PAGE_SIZE", 50))
+)
+
+
+def _database_scheme(url: str) -> str:
+    return url.split(":", 1)[0].split("+", 1)[0].lower()
+
+
+def _database_backend_options(url: str) -> Dict[str, Any]:
+    """Translate the pool size settings into the option names each backend expects."""
+    scheme = _database_scheme(url)
+    if scheme in {"postgres", "postgresql"}:
+        return {"min_size": DATABASE_POOL_MIN_SIZE, "max_size": DATABASE_POOL_MAX_SIZE}
+    if scheme == "mysql":
+        return {"minsize": DATABASE_POOL_MIN_SIZE, "maxsize": DATABASE_POOL_MAX_SIZE}
+    # aiosqlite has no native pool and rejects unknown connect() kwargs.
+    return {}
+
+
+class PooledDatabase(databases.Database):
+    """Shared database handle that bounds concurrent connections and records pool statistics."""
+
+    def __init__(self, url: str, *, max_size: int, acquire_timeout: float, **options: Any):
+        super().__init__(url, **options)
+        self.max_size = max_size
+        self.acquire_timeout = acquire_timeout
+        self._slots = asyncio.Semaphore(max_size)
+        self._holds_slot: ContextVar[bool] = ContextVar(f"db_slot_{id(self)}", default=False)
+        self._in_use = 0
+        self._waiting = 0
+        self._acquired_total = 0
+        self._timeouts = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    @asynccontextmanager
+    async def acquire(self):
+        """Hold a pool slot for the current task; nested acquisitions reuse the held slot."""
+        if self._holds_slot.get():
+            yield self
+            return
+
+        started = time.perf_counter()
+        self._waiting += 1
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout=self.acquire_timeout)
+        except asyncio.TimeoutError as exc:
+            self._timeouts += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Database is busy. Please retry shortly.",
+            ) from exc
+        finally:
+            self._waiting -= 1
+
+        waited = time.perf_counter() - started
+        self._acquired_total += 1
+        self._wait_total += waited
+        self._wait_max = max(self._wait_max, waited)
+        self._in_use += 1
+        token = self._holds_slot.set(True)
+        try:
+            yield self
+        finally:
+            self._holds_slot.reset(token)
+            self._in_use -= 1
+            self._slots.release()
+
+    async def execute(self, query, values: Optional[dict] = None) -> Any:
+        async with self.acquire():
+            return await super().execute(query, values)
+
+    async def execute_many(self, query, values: list) -> None:
+        async with self.acquire():
+            return await super().execute_many(query, values)
+
+    async def fetch_one(self, query, values: Optional[dict] = None):
+        async with self.acquire():
+            return await super().fetch_one(query, values)
+
+    async def fetch_all(self, query, values: Optional[dict] = None):
+        async with self.acquire():
+            return await super().fetch_all(query, values)
+
+    async def fetch_val(self, query, values: Optional[dict] = None, column: Any = 0) -> Any:
+        async with self.acquire():
+            return await super().fetch_val(query, values, column=column)
+
+    @asynccontextmanager
+    async def transaction(self, **kwargs: Any):
+        """Run the block in a transaction on a single pooled connection."""
+        async with self.acquire():
+            async with super().transaction(**kwargs):
+                yield self
+
+    def stats(self) -> Dict[str, Any]:
+        backend_pool = getattr(self._backend, "_pool", None)
+        stats: Dict[str, Any] = {
+            "connected": self.is_connected,
+            "min_size": DATABASE_POOL_MIN_SIZE,
+            "max_size": self.max_size,
+            "in_use": self._in_use,
+            "available": self.max_size - self._in_use,
+            "waiting": self._waiting,
+            "acquired_total": self._acquired_total,
+            "acquire_timeouts": self._timeouts,
+            "acquire_timeout_seconds": self.acquire_timeout,
+            "avg_wait_ms": round(self._wait_total / self._acquired_total * 1000, 3)
+            if self._acquired_total
+            else 0.0,
+            "max_wait_ms": round(self._wait_max * 1000, 3),
+        }
+        if hasattr(backend_pool, "get_size"):
+            stats["backend_size"] = backend_pool.get_size()
+        if hasattr(backend_pool, "get_idle_size"):
+            stats["backend_idle"] = backend_pool.get_idle_size()
+        return stats
+
+
+database = PooledDatabase(
+    DATABASE_URL,
+    max_size=DATABASE_POOL_MAX_SIZE,
+    acquire_timeout=DATABASE_POOL_ACQUIRE_TIMEOUT,
+    **_database_backend_options(DATABASE_URL),
+)
+metadata = sqlalchemy.MetaData()
+
+
 MAX_GEMINI_UPLOAD_MB = max(1, _int_env("GEMINI_MAX_UPLOAD_MB", 20))
 MAX_GEMINI_UPLOAD_BYTES = MAX_GEMINI_UPLOAD_MB * 1024 * 1024
+GEMINI_UPLOAD_READ_CHUNK_BYTES = 256 * 1024
+GEMINI_UPLOAD_BATCH_MAX_FILES = max(1, _int_env("GEMINI_UPLOAD_BATCH_MAX_FILES", 10))
+GEMINI_UPLOAD_BATCH_CONCURRENCY = max(1, _int_env("GEMINI_UPLOAD_BATCH_CONCURRENCY", 4))
+# Images above this size are downscaled and re-encoded on a process pool before upload.
+GEMINI_PREPROCESS_WORKERS = max(0, _int_env("GEMINI_PREPROCESS_WORKERS", 2))
+GEMINI_IMAGE_PREPROCESS_MIN_KB = max(0, _int_env("GEMINI_IMAGE_PREPROCESS_MIN_KB", 512))
+GEMINI_IMAGE_MAX_DIMENSION = max(256, _int_env("GEMINI_IMAGE_MAX_DIMENSION", 2048))
+GEMINI_IMAGE_JPEG_QUALITY = min(95, max(40, _int_env("GEMINI_IMAGE_JPEG_QUALITY", 85)))
+# Plain-text and markdown files up to this size are sent inline instead of uploaded.
+GEMINI_INLINE_TEXT_MAX_KB = max(0, _int_env("GEMINI_INLINE_TEXT_MAX_KB", 256))
 GEMINI_FILE_POLL_INTERVAL = max(0.25, _float_env("GEMINI_FILE_POLL_INTERVAL", 1.0))
 GEMINI_FILE_POLL_TIMEOUT = max(5.0, _float_env("GEMINI_FILE_POLL_TIMEOUT", 60.0))
-STREAMING_TOKEN_DELAY = max(0.0, _float_env("GRAY_STREAMING_TOKEN_DELAY_SECONDS", 0.045))
+GEMINI_FILE_POLL_MAX_INTERVAL = max(GEMINI_FILE_POLL_INTERVAL, _float_env("GEMINI_FILE_POLL_MAX_INTERVAL", 8.0))
+# Gemini deletes uploaded files 48 hours after creation.
+GEMINI_FILE_LIFETIME = timedelta(hours=48)
+GEMINI_FILE_REUSE_MARGIN = timedelta(seconds=max(0, _int_env("GEMINI_FILE_REUSE_MARGIN_SECONDS", 3600)))
+STREAMING_FRAME_WINDOW = max(0.0, _float_env("GRAY_STREAMING_FRAME_WINDOW_MS", 30.0)) / 1000
+STREAMING_FRAME_MAX_BYTES = max(64, _int_env("GRAY_STREAMING_FRAME_MAX_BYTES", 2048))
+GEMINI_MAX_CONCURRENCY = max(1, _int_env("GEMINI_MAX_CONCURRENCY", 8))
+GEMINI_REQUEST_TIMEOUT = max(1.0, _float_env("GEMINI_REQUEST_TIMEOUT", 60.0))
+GEMINI_TITLE_TIMEOUT = max(1.0, _float_env("GEMINI_TITLE_TIMEOUT", 10.0))
+GEMINI_STREAM_WORKERS = max(1, _int_env("GEMINI_STREAM_WORKERS", 8))
+GEMINI_STREAM_QUEUE_SIZE = max(1, _int_env("GEMINI_STREAM_QUEUE_SIZE", 64))
+GEMINI_STREAM_ACQUIRE_TIMEOUT = max(0.05, _float_env("GEMINI_STREAM_ACQUIRE_TIMEOUT", 2.0))
+CONVERSATION_CACHE_SIZE = max(0, _int_env("CONVERSATION_CACHE_SIZE", 512))
+CONVERSATION_CACHE_TTL = max(1.0, _float_env("CONVERSATION_CACHE_TTL_SECONDS", 300.0))
+CONVERSATION_FLUSH_INTERVAL = max(0.01, _float_env("CONVERSATION_FLUSH_INTERVAL_MS", 500.0) / 1000)
+CONVERSATION_FLUSH_BATCH_SIZE = max(1, _int_env("CONVERSATION_FLUSH_BATCH_SIZE", 20))
+CONVERSATION_FLUSH_MAX_PENDING = max(1, _int_env("CONVERSATION_FLUSH_MAX_PENDING", 500))
+CONVERSATION_FLUSH_RETRY_SECONDS = max(1.0, _float_env("CONVERSATION_FLUSH_RETRY_SECONDS", 600.0))
+CONVERSATION_FLUSH_MAX_BACKOFF = max(0.01, _float_env("CONVERSATION_FLUSH_MAX_BACKOFF_SECONDS", 30.0))
+CHAT_TITLE_CACHE_SIZE = max(0, _int_env("CHAT_TITLE_CACHE_SIZE", 1024))
+CHAT_TITLE_CACHE_TTL = max(1.0, _float_env("CHAT_TITLE_CACHE_TTL_SECONDS", 86400.0))
+STREAK_TOUCH_CACHE_SIZE = max(0, _int_env("STREAK_TOUCH_CACHE_SIZE", 10000))
+GOOGLE_TOKEN_REFRESH_MARGIN = max(0.0, _float_env("GOOGLE_TOKEN_REFRESH_MARGIN_SECONDS", 300.0))
+GEMINI_CONTEXT_TOKEN_BUDGET = max(256, _int_env("GEMINI_CONTEXT_TOKEN_BUDGET", 6000))
+GEMINI_SUMMARY_TOKEN_BUDGET = max(64, _int_env("GEMINI_SUMMARY_TOKEN_BUDGET", 400))
+GEMINI_SUMMARY_WORKERS = max(1, _int_env("GEMINI_SUMMARY_WORKERS", 2))
 
 def _split_env_list(value: Optional[str]) -> List[str]:
     if not value:
@@ -142,6 +328,8 @@ chat_sessions = sqlalchemy.Table(
     sqlalchemy.Column("title", sqlalchemy.String),
     sqlalchemy.Column("created_at", sqlalchemy.DateTime, default=datetime.utcnow),
     sqlalchemy.Column("updated_at", sqlalchemy.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow),
+    # Keyset pagination of the sidebar, newest first.
+    sqlalchemy.Index("ix_chat_sessions_user_updated", "user_id", "updated_at", "id"),
 )
 
 calendars = sqlalchemy.Table(
@@ -167,6 +355,9 @@ calendar_events = sqlalchemy.Table(
     sqlalchemy.Column("start_time", sqlalchemy.DateTime),
     sqlalchemy.Column("end_time", sqlalchemy.DateTime),
     sqlalchemy.Column("created_at", sqlalchemy.DateTime, default=datetime.utcnow),
+    # Range lookups: events starting inside a window, and events spanning its start.
+    sqlalchemy.Index("ix_calendar_events_user_start", "user_id", "start_time"),
+    sqlalchemy.Index("ix_calendar_events_user_end", "user_id", "end_time"),
 )
 
 plans = sqlalchemy.Table(
@@ -216,6 +407,25 @@ proactivity_logs = sqlalchemy.Table(
     sqlalchemy.Column("notes", sqlalchemy.String, nullable=True),
     sqlalchemy.Column("created_at", sqlalchemy.DateTime, default=datetime.utcnow),
     sqlalchemy.Column("updated_at", sqlalchemy.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow),
+    # UTC day of a daily check-in; null for ad-hoc logs, which may share a day.
+    sqlalchemy.Column("activity_day", sqlalchemy.Date, nullable=True),
+    # Keyset pagination of the history, newest first.
+    sqlalchemy.Index("ix_proactivity_logs_user_activity", "user_id", "activity_date", "id"),
+    # One check-in per user per day; the conflict target of the check-in upsert.
+    sqlalchemy.Index("ux_proactivity_logs_user_day", "user_id", "activity_day", unique=True),
+)
+
+# Per-user proactivity streak summary, maintained as logs are written.
+proactivity_streaks = sqlalchemy.Table(
+    "proactivity_streaks",
+    metadata,
+    sqlalchemy.Column("id", sqlalchemy.Integer, primary_key=True, index=True),
+    sqlalchemy.Column("user_id", sqlalchemy.ForeignKey("users.id"), unique=True),
+    sqlalchemy.Column("current_streak", sqlalchemy.Integer, default=0),
+    sqlalchemy.Column("best_streak", sqlalchemy.Integer, default=0),
+    sqlalchemy.Column("last_qualifying_day", sqlalchemy.Date, nullable=True),
+    sqlalchemy.Column("created_at", sqlalchemy.DateTime, default=datetime.utcnow),
+    sqlalchemy.Column("updated_at", sqlalchemy.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow),
 )
 
 google_calendar_credentials = sqlalchemy.Table(
@@ -234,6 +444,22 @@ google_calendar_credentials = sqlalchemy.Table(
     sqlalchemy.Column("updated_at", sqlalchemy.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow),
 )
 
+# Content hash -> Gemini file index used to skip re-uploading identical bytes
+gemini_file_uploads = sqlalchemy.Table(
+    "gemini_file_uploads",
+    metadata,
+    sqlalchemy.Column("id", sqlalchemy.Integer, primary_key=True, index=True),
+    sqlalchemy.Column("content_sha256", sqlalchemy.String, nullable=False),
+    sqlalchemy.Column("mime_type", sqlalchemy.String, nullable=False, default=""),
+    sqlalchemy.Column("size_bytes", sqlalchemy.Integer),
+    sqlalchemy.Column("gemini_name", sqlalchemy.String),
+    sqlalchemy.Column("payload", sqlalchemy.String),  # JSON-serialized GeminiFile
+    sqlalchemy.Column("expires_at", sqlalchemy.DateTime),
+    sqlalchemy.Column("created_at", sqlalchemy.DateTime, default=datetime.utcnow),
+    sqlalchemy.Column("updated_at", sqlalchemy.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow),
+    sqlalchemy.UniqueConstraint("content_sha256", "mime_type", name="uq_gemini_file_uploads_content"),
+)
+
 # Pydantic models
 class UserBase(BaseModel):
     email: EmailStr
@@ -400,6 +626,51 @@ class HabitUpdate(BaseModel):
     streak_label: Optional[str] = None
     previous_label: Optional[str] = None
 
+class PlanBatchOperation(PlanUpdate):
+    op: Literal["create", "update", "delete"]
+    id: Optional[int] = None
+
+class PlanBatchRequest(BaseModel):
+    operations: List[PlanBatchOperation]
+
+class PlanBatchResult(BaseModel):
+    index: int
+    op: str
+    status: int
+    id: Optional[int] = None
+    detail: Optional[str] = None
+    plan: Optional[Plan] = None
+
+class PlanBatchResponse(BaseModel):
+    results: List[PlanBatchResult]
+
+class HabitBatchOperation(HabitUpdate):
+    op: Literal["create", "update", "delete"]
+    id: Optional[int] = None
+
+class HabitBatchRequest(BaseModel):
+    operations: List[HabitBatchOperation]
+
+class HabitBatchResult(BaseModel):
+    index: int
+    op: str
+    status: int
+    id: Optional[int] = None
+    detail: Optional[str] = None
+    habit: Optional[Habit] = None
+
+class HabitBatchResponse(BaseModel):
+    results: List[HabitBatchResult]
+
+class DashboardSnapshot(BaseModel):
+    user: Optional[User] = None
+    calendars: Optional[List[Calendar]] = None
+    calendar_events: Optional[List[CalendarEvent]] = None
+    plans: Optional[List[Plan]] = None
+    habits: Optional[List[Habit]] = None
+    streak: Optional[UserStreak] = None
+    proactivity: Optional[List[ProactivityLog]] = None
+
 # AI Chat models
 class GeminiAttachment(BaseModel):
     name: str
@@ -407,6 +678,7 @@ class GeminiAttachment(BaseModel):
     mime_type: str
     display_name: Optional[str] = None
     size_bytes: Optional[int] = None
+    text: Optional[str] = None
 
 
 class ChatMessage(BaseModel):
@@ -449,6 +721,9 @@ class GeminiFile(BaseModel):
     state: Optional[str] = None
     create_time: Optional[str] = None
     update_time: Optional[str] = None
+    expiration_time: Optional[str] = None
+    # Set instead of a Gemini URI for text attachments that are sent inline.
+    text: Optional[str] = None
 
 # Gemini AI and Supabase setup
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
@@ -497,6 +772,14 @@ else:
 
 SUPABASE_CONVERSATIONS_ENABLED = supabase is not None
 
+# Blocking Gemini SDK calls run here so a slow completion never stalls the event loop.
+GEMINI_EXECUTOR = ThreadPoolExecutor(max_workers=GEMINI_MAX_CONCURRENCY, thread_name_prefix="gemini")
+# Background summary rewrites get their own small pool so they never queue ahead of chat calls.
+GEMINI_SUMMARY_EXECUTOR = ThreadPoolExecutor(max_workers=GEMINI_SUMMARY_WORKERS, thread_name_prefix="gemini-summary")
+CONVERSATIONS_TABLE = "conversations"
+CONVERSATION_MESSAGES_TABLE = "conversation_messages"
+APPEND_CONVERSATION_MESSAGES_RPC = "append_conversation_messages"
+
 
 def _conversation_store_available() -> bool:
     return supabase is not None and SUPABASE_CONVERSATIONS_ENABLED
@@ -506,6 +789,268 @@ LOCAL_CONVERSATION_STORE: Dict[str, List[Dict[str, Any]]] = {}
 LOCAL_CONVERSATION_LOCK = asyncio.Lock()
 
 
+class ConversationHistoryCache:
+    """LRU cache of recent conversation histories, kept in step with the store on every write."""
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, List[Dict[str, Any]]]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, conversation_id: str) -> Optional[List[Dict[str, Any]]]:
+        entry = self._entries.get(conversation_id)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._entries[conversation_id]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(conversation_id)
+        self.hits += 1
+        return list(entry[1])
+
+    def contains(self, conversation_id: str) -> bool:
+        entry = self._entries.get(conversation_id)
+        return entry is not None and entry[0] >= time.monotonic()
+
+    def put(self, conversation_id: str, history: List[Dict[str, Any]]) -> None:
+        if self.max_entries <= 0:
+            return
+        self._entries[conversation_id] = (time.monotonic() + self.ttl, list(history))
+        self._entries.move_to_end(conversation_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def append(self, conversation_id: str, messages: List[Dict[str, Any]]) -> None:
+        """Extend a cached history; histories that are not cached stay uncached."""
+        if not self.contains(conversation_id):
+            return
+        _, history = self._entries[conversation_id]
+        self.put(conversation_id, history + list(messages))
+
+    def invalidate(self, conversation_id: str) -> None:
+        self._entries.pop(conversation_id, None)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+        }
+
+
+CONVERSATION_CACHE = ConversationHistoryCache(CONVERSATION_CACHE_SIZE, CONVERSATION_CACHE_TTL)
+
+
+class ConversationWriteBehind:
+    """Buffers conversation messages and appends them to Supabase in per-conversation batches."""
+
+    def __init__(
+        self,
+        interval: float,
+        batch_size: int,
+        max_pending: int,
+        retry_budget: float,
+        max_backoff: float,
+    ):
+        self.interval = interval
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self.retry_budget = retry_budget
+        self.max_backoff = max_backoff
+        # Entries are (enqueued_at, failed_attempts, message).
+        self._pending: Dict[str, List[Tuple[float, int, Dict[str, Any]]]] = {}
+        self._pending_count = 0
+        # conversation_id -> (consecutive failures, monotonic time of the next attempt)
+        self._backoff: Dict[str, Tuple[int, float]] = {}
+        self._wake = asyncio.Event()
+        # conversation_id -> [lock, number of flushes using it]
+        self._locks: Dict[str, List[Any]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.flushes = 0
+        self.flushed_messages = 0
+        self.failures = 0
+        self.dropped_messages = 0
+        self.last_flush_at: Optional[datetime] = None
+        self.last_flush_ms = 0.0
+        self._lag_total = 0.0
+        self._lag_max = 0.0
+
+    def enqueue(self, conversation_id: str, message: Dict[str, Any]) -> None:
+        batch = self._pending.setdefault(conversation_id, [])
+        batch.append((time.monotonic(), 0, message))
+        self._pending_count += 1
+        if len(batch) >= self.batch_size or self._pending_count >= self.max_pending:
+            self._wake.set()
+
+    def pending_messages(self, conversation_id: str) -> List[Dict[str, Any]]:
+        return [message for _, _, message in self._pending.get(conversation_id, [])]
+
+    async def flush(self, conversation_id: Optional[str] = None, force: bool = False) -> None:
+        """Write buffered messages for one conversation, or for all of them."""
+        targets = [conversation_id] if conversation_id else list(self._pending)
+        now = time.monotonic()
+        # A conversation with a write in flight still needs waiting on, even if nothing new is queued.
+        targets = [
+            target
+            for target in targets
+            if target in self._locks
+            or (target in self._pending and (force or self._backoff.get(target, (0, 0.0))[1] <= now))
+        ]
+        if not targets:
+            return
+
+        started = time.perf_counter()
+        written = await asyncio.gather(*(self._flush_conversation(target) for target in targets))
+        if any(written):
+            self.flushes += 1
+            self.last_flush_at = datetime.utcnow()
+            self.last_flush_ms = (time.perf_counter() - started) * 1000
+
+    async def _flush_conversation(self, conversation_id: str) -> bool:
+        entry = self._locks.get(conversation_id)
+        if entry is None:
+            entry = self._locks[conversation_id] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                batch = self._pending.pop(conversation_id, None)
+                if not batch:
+                    return False
+                self._pending_count -= len(batch)
+                await self._write(conversation_id, batch)
+                return True
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                self._locks.pop(conversation_id, None)
+
+    def _requeue_or_drop(
+        self,
+        conversation_id: str,
+        batch: List[Tuple[float, int, Dict[str, Any]]],
+        error: Exception,
+    ) -> None:
+        now = time.monotonic()
+        retryable = _is_retryable_store_error(error) or not _conversation_store_available()
+        retry = [
+            (enqueued_at, attempts + 1, message)
+            for enqueued_at, attempts, message in batch
+            if retryable and now - enqueued_at < self.retry_budget
+        ]
+        dropped = len(batch) - len(retry)
+        if dropped:
+            self.dropped_messages += dropped
+            reason = f"retried for {self.retry_budget:.0f}s" if retryable else "non-retryable error"
+            print(f"Dropping {dropped} message(s) for conversation {conversation_id} ({reason})")
+            # The cache already holds the dropped messages; make the next read go to the store.
+            CONVERSATION_CACHE.invalidate(conversation_id)
+        if retry:
+            self._pending[conversation_id] = retry + self._pending.get(conversation_id, [])
+            self._pending_count += len(retry)
+            failures = self._backoff.get(conversation_id, (0, 0.0))[0] + 1
+            delay = min(self.max_backoff, self.interval * 2 ** failures)
+            self._backoff[conversation_id] = (failures, now + delay * random.uniform(0.5, 1.0))
+        else:
+            self._backoff.pop(conversation_id, None)
+
+    async def _write(self, conversation_id: str, batch: List[Tuple[float, int, Dict[str, Any]]]) -> None:
+        messages = [message for _, _, message in batch]
+        if not _conversation_store_available():
+            # The store was disabled after these were buffered; keep them readable locally.
+            self._backoff.pop(conversation_id, None)
+            async with LOCAL_CONVERSATION_LOCK:
+                LOCAL_CONVERSATION_STORE.setdefault(conversation_id, []).extend(messages)
+            return
+
+        try:
+            await asyncio.to_thread(
+                lambda: supabase.rpc(APPEND_CONVERSATION_MESSAGES_RPC, {
+                    "p_conversation_id": conversation_id,
+                    "p_messages": [_message_to_row(message) for message in messages],
+                }).execute()
+            )
+        except Exception as error:
+            self.failures += 1
+            _handle_conversation_store_error("Error saving messages", error)
+            self._requeue_or_drop(conversation_id, batch, error)
+            return
+
+        self._backoff.pop(conversation_id, None)
+        now = time.monotonic()
+        for enqueued_at, _, _ in batch:
+            lag = now - enqueued_at
+            self._lag_total += lag
+            self._lag_max = max(self._lag_max, lag)
+        self.flushed_messages += len(batch)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self.flush()
+            except Exception as error:  # pragma: no cover - keep the flusher alive
+                print(f"Conversation flush error: {error}")
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush(force=True)
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        oldest = min(
+            (batch[0][0] for batch in self._pending.values() if batch),
+            default=None,
+        )
+        return {
+            "pending_messages": self._pending_count,
+            "pending_conversations": len(self._pending),
+            "oldest_pending_age_ms": round((now - oldest) * 1000, 3) if oldest is not None else 0.0,
+            "flushes": self.flushes,
+            "flushed_messages": self.flushed_messages,
+            "failures": self.failures,
+            "dropped_messages": self.dropped_messages,
+            "backing_off_conversations": len(self._backoff),
+            "last_flush_at": self.last_flush_at.isoformat() if self.last_flush_at else None,
+            "last_flush_ms": round(self.last_flush_ms, 3),
+            "avg_lag_ms": round(self._lag_total / self.flushed_messages * 1000, 3)
+            if self.flushed_messages
+            else 0.0,
+            "max_lag_ms": round(self._lag_max * 1000, 3),
+        }
+
+
+CONVERSATION_WRITER = ConversationWriteBehind(
+    CONVERSATION_FLUSH_INTERVAL,
+    CONVERSATION_FLUSH_BATCH_SIZE,
+    CONVERSATION_FLUSH_MAX_PENDING,
+    CONVERSATION_FLUSH_RETRY_SECONDS,
+    CONVERSATION_FLUSH_MAX_BACKOFF,
+)
+
+
 def _disable_conversation_store(reason: str) -> None:
     global SUPABASE_CONVERSATIONS_ENABLED
     if SUPABASE_CONVERSATIONS_ENABLED:
@@ -522,12 +1067,44 @@ def _handle_conversation_store_error(context: str, error: Exception) -> None:
     details = message or str(error)
     print(f"{context}: {details}")
     normalized = (details or "").lower()
-    if code == "PGRST205" or "could not find the table" in normalized:
-        _disable_conversation_store("Supabase 'conversations' table missing; suppressing further requests.")
+    if code in {"PGRST202", "PGRST205"} or "could not find the" in normalized:
+        _disable_conversation_store(
+            "Supabase conversation tables or append function missing; suppressing further requests."
+        )
+
+
+def _is_retryable_store_error(error: Exception) -> bool:
+    """Whether a failed Supabase write could succeed if sent again unchanged."""
+    code = error.get("code") if isinstance(error, dict) else getattr(error, "code", None)
+    # SQLSTATE class 22 (data exception) and 23 (integrity constraint violation).
+    if str(code or "")[:2] in {"22", "23"}:
+        return False
+    status_code = getattr(getattr(error, "response", None), "status_code", None)
+    if isinstance(status_code, int) and 400 <= status_code < 500 and status_code not in {408, 429}:
+        return False
+    return True
+
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    """Open shared resources once for the lifetime of the process and drain them on shutdown."""
+    await database.connect()
+    CONVERSATION_WRITER.start()
+    try:
+        yield
+    finally:
+        await CONVERSATION_WRITER.stop()
+        await STREAK_TOUCHER.drain()
+        await CONTEXT_BUILDER.shutdown()
+        await database.disconnect()
+        GEMINI_EXECUTOR.shutdown(wait=False, cancel_futures=True)
+        GEMINI_SUMMARY_EXECUTOR.shutdown(wait=False, cancel_futures=True)
+        STREAMING_POOL.shutdown()
+        ATTACHMENT_PREPROCESSOR.shutdown()
 
 
 # FastAPI app
-app = FastAPI(title="User Profile API with AI Chat", version="1.0.0")
+app = FastAPI(title="User Profile API with AI Chat", version="1.0.0", lifespan=lifespan)
 
 # CORS middleware
 app.add_middleware(
@@ -536,18 +1113,269 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 # Security
 security = HTTPBearer()
 
 # Database dependency
-async def get_database():
-    await database.connect()
+async def get_database() -> databases.Database:
+    """Return the shared, lifespan-managed database pool."""
+    return database
+
+# Postgres has always supported INSERT/UPDATE ... RETURNING; SQLite gained it in 3.35.
+DATABASE_SCHEME = _database_scheme(DATABASE_URL)
+DATABASE_SUPPORTS_RETURNING = DATABASE_SCHEME in {"postgres", "postgresql"} or (
+    DATABASE_SCHEME == "sqlite" and sqlite3.sqlite_version_info >= (3, 35, 0)
+)
+_SQLITE_NAMED_DIALECT = sqlite_dialect.dialect(paramstyle="named")
+
+
+def _with_returning(statement: Any, table: sqlalchemy.Table) -> Any:
+    """Attach ``RETURNING <all columns>`` to an INSERT or UPDATE."""
+    if DATABASE_SCHEME != "sqlite":
+        return statement.returning(*table.c)
+    compiled = statement.compile(
+        dialect=_SQLITE_NAMED_DIALECT, compile_kwargs={"render_postcompile": True}
+    )
+    quote = _SQLITE_NAMED_DIALECT.identifier_preparer.quote
+    columns = ", ".join(quote(column.name) for column in table.c)
+    binds = [
+        sqlalchemy.bindparam(key, value, type_=compiled.binds[key].type)
+        for key, value in compiled.params.items()
+    ]
+    return (
+        sqlalchemy.text(f"{compiled.string} RETURNING {columns}")
+        .bindparams(*binds)
+        .columns(*table.c)
+    )
+
+
+async def insert_returning(
+    db: databases.Database, table: sqlalchemy.Table, values: Dict[str, Any]
+) -> Any:
+    """Insert a row and return it, in one statement where the engine supports RETURNING."""
+    statement = table.insert().values(**values)
+    if DATABASE_SUPPORTS_RETURNING:
+        return await db.fetch_one(_with_returning(statement, table))
+    row_id = await db.execute(statement)
+    return await db.fetch_one(table.select().where(table.c.id == row_id))
+
+
+async def update_returning(
+    db: databases.Database,
+    table: sqlalchemy.Table,
+    whereclause: Any,
+    values: Dict[str, Any],
+) -> Any:
+    """Update the rows matching ``whereclause`` and return the first, or None if none matched."""
+    statement = table.update().where(whereclause).values(**values)
+    if DATABASE_SUPPORTS_RETURNING:
+        return await db.fetch_one(_with_returning(statement, table))
+    # Resolve the ids first: the update may change the columns ``whereclause`` tests.
+    async with db.transaction():
+        ids = [row["id"] for row in await db.fetch_all(sqlalchemy.select([table.c.id]).where(whereclause))]
+        if not ids:
+            return None
+        await db.execute(table.update().where(table.c.id.in_(ids)).values(**values))
+        return await db.fetch_one(table.select().where(table.c.id == ids[0]))
+
+
+async def _fetch_returning(
+    db: databases.Database, statement: Any, table: sqlalchemy.Table
+) -> List[Any]:
+    return await db.fetch_all(_with_returning(statement, table))
+
+
+async def apply_batch_operations(
+    db: databases.Database,
+    table: sqlalchemy.Table,
+    user_id: int,
+    operations: List[Any],
+    fields: Tuple[str, ...],
+    required_create_fields: Tuple[str, ...],
+    defaults: Dict[str, Any],
+) -> List[Dict[str, Any]]:
+    """Apply create/update/delete operations on a per-user table in one transaction."""
+    now = datetime.utcnow()
+    results: List[Dict[str, Any]] = [
+        {"index": index, "op": operation.op, "id": operation.id}
+        for index, operation in enumerate(operations)
+    ]
+    creates: List[Tuple[int, Dict[str, Any]]] = []
+    deletes: Dict[int, int] = {}
+    update_groups: Dict[Tuple[Tuple[str, Any], ...], Dict[int, int]] = {}
+    touched_ids: set = set()
+
+    for index, operation in enumerate(operations):
+        values = {
+            field: getattr(operation, field)
+            for field in fields
+            if field in operation.__fields_set__ and getattr(operation, field) is not None
+        }
+        if operation.op == "create":
+            missing = [field for field in required_create_fields if field not in values]
+            if missing:
+                results[index].update(
+                    status=422, detail=f"Missing required fields: {', '.join(missing)}"
+                )
+                continue
+            creates.append((index, {**defaults, **values}))
+            continue
+        if operation.id is None:
+            results[index].update(
+                status=422, detail="An id is required for update and delete operations"
+            )
+            continue
+        if operation.id in touched_ids:
+            results[index].update(status=409, detail="The same id may only appear once per batch")
+            continue
+        touched_ids.add(operation.id)
+        if operation.op == "delete":
+            deletes[operation.id] = index
+        else:
+            update_groups.setdefault(tuple(sorted(values.items())), {})[operation.id] = index
+
+    def owned(ids: Any) -> Any:
+        return (table.c.user_id == user_id) & table.c.id.in_(list(ids))
+
+    async with db.transaction():
+        for group_values, id_to_index in update_groups.items():
+            if not group_values:
+                rows = await db.fetch_all(table.select().where(owned(id_to_index)))
+            else:
+                statement = table.update().where(owned(id_to_index)).values(
+                    **dict(group_values), updated_at=now
+                )
+                if DATABASE_SUPPORTS_RETURNING:
+                    rows = await _fetch_returning(db, statement, table)
+                else:
+                    await db.execute(statement)
+                    rows = await db.fetch_all(table.select().where(owned(id_to_index)))
+            for row in rows:
+                results[id_to_index[row["id"]]].update(status=200, row=row)
+
+        if deletes:
+            if DATABASE_SUPPORTS_RETURNING:
+                deleted_rows = await _fetch_returning(db, table.delete().where(owned(deletes)), table)
+            else:
+                deleted_rows = await db.fetch_all(table.select().where(owned(deletes)))
+                await db.execute(table.delete().where(owned(deletes)))
+            for row in deleted_rows:
+                results[deletes[row["id"]]].update(status=204)
+
+        if creates:
+            rows_to_insert = [
+                {**values, "user_id": user_id, "created_at": now, "updated_at": now}
+                for _, values in creates
+            ]
+            if DATABASE_SUPPORTS_RETURNING:
+                # Ids are assigned in insertion order within the statement.
+                created_rows = sorted(
+                    await _fetch_returning(db, table.insert().values(rows_to_insert), table),
+                    key=lambda row: row["id"],
+                )
+            else:
+                created_rows = [await insert_returning(db, table, values) for values in rows_to_insert]
+            for (index, _), row in zip(creates, created_rows):
+                results[index].update(status=201, id=row["id"], row=row)
+
+    for result in results:
+        result.setdefault("status", 404)
+        if result["status"] == 404:
+            result["detail"] = "Not found"
+    return results
+
+
+
+async def upsert_returning(
+    db: databases.Database,
+    table: sqlalchemy.Table,
+    values: Dict[str, Any],
+    conflict_columns: Tuple[str, ...],
+    update_values: Dict[str, Any],
+) -> Any:
+    """Insert a row, or update the row it collides with on ``conflict_columns``, and return it."""
+    if DATABASE_SUPPORTS_RETURNING:
+        dialect_insert = (
+            sqlite_dialect.insert if DATABASE_SCHEME == "sqlite" else postgresql_dialect.insert
+        )
+        statement = (
+            dialect_insert(table)
+            .values(**values)
+            .on_conflict_do_update(
+                index_elements=[table.c[name] for name in conflict_columns],
+                set_=update_values,
+            )
+        )
+        return await db.fetch_one(_with_returning(statement, table))
+
+    conflict = sqlalchemy.and_(*(table.c[name] == values[name] for name in conflict_columns))
+    async with db.transaction():
+        updated = await update_returning(db, table, conflict, update_values)
+        if updated is not None:
+            return updated
+        return await insert_returning(db, table, values)
+
+
+def encode_page_cursor(sort_value: Optional[datetime], row_id: int) -> str:
+    """Encode the (sort key, id) of the last row on a page as an opaque cursor."""
+    raw = json.dumps(
+        [sort_value.isoformat() if sort_value is not None else None, row_id],
+        separators=(",", ":"),
+    )
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_page_cursor(cursor: str) -> Tuple[Optional[datetime], int]:
     try:
-        yield database
-    finally:
-        await database.disconnect()
+        padded = cursor + "=" * (-len(cursor) % 4)
+        sort_value, row_id = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        return (datetime.fromisoformat(sort_value) if sort_value is not None else None), int(row_id)
+    except (ValueError, TypeError) as exc:
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor") from exc
+
+
+async def fetch_keyset_page(
+    db: databases.Database,
+    query: Any,
+    sort_column: Any,
+    id_column: Any,
+    cursor: Optional[str],
+    limit: Optional[int],
+) -> Tuple[List[Any], Optional[str]]:
+    """Fetch one newest-first page of ``query`` by (sort_column, id_column), NULL sort keys last."""
+    sort_value, row_id = decode_page_cursor(cursor) if cursor else (None, None)
+    paged = cursor is not None or limit is not None
+    limit = limit or PAGINATION_DEFAULT_PAGE_SIZE
+    # The raw key is selected separately because the response columns may coalesce it.
+    query = query.add_columns(sort_column.label("page_sort_key"))
+
+    rows: List[Any] = []
+    if not cursor or sort_value is not None:
+        keyed = query.where(sort_column.isnot(None))
+        if cursor:
+            keyed = keyed.where(
+                (sort_column < sort_value) | ((sort_column == sort_value) & (id_column < row_id))
+            )
+        keyed = keyed.order_by(sort_column.desc(), id_column.desc())
+        rows = list(await db.fetch_all(keyed.limit(limit + 1) if paged else keyed))
+
+    # Rows without a sort key form a final phase, walked by id alone.
+    if not paged or len(rows) <= limit:
+        unkeyed = query.where(sort_column.is_(None))
+        if cursor and sort_value is None:
+            unkeyed = unkeyed.where(id_column < row_id)
+        unkeyed = unkeyed.order_by(id_column.desc())
+        rows += await db.fetch_all(unkeyed.limit(limit + 1 - len(rows)) if paged else unkeyed)
+
+    if not paged or len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_page_cursor(last["page_sort_key"], last[id_column.name])
+
 
 # Helper functions
 def generate_initials(full_name: str) -> str:
@@ -560,78 +1388,303 @@ def generate_initials(full_name: str) -> str:
     return "U"
 
 
-async def persist_upload_file(upload_file: UploadFile) -> str:
-    """Persist an uploaded file to a temporary path with size validation."""
-    suffix = ""
-    if upload_file.filename:
-        suffix = Path(upload_file.filename).suffix
+async def spool_upload_file(upload_file: UploadFile) -> Tuple[IO[bytes], str, int]:
+    """Hash and size-check Starlette's spooled upload in place and rewind it for the Gemini SDK."""
+    declared_size = getattr(upload_file, "size", None)
+    if declared_size is not None and declared_size > MAX_GEMINI_UPLOAD_BYTES:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"File exceeds {MAX_GEMINI_UPLOAD_MB} MB limit.",
+        )
 
-    temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=suffix)
-    written = 0
-    try:
-        while True:
-            chunk = await upload_file.read(1024 * 1024)
-            if not chunk:
-                break
-            written += len(chunk)
-            if written > MAX_GEMINI_UPLOAD_BYTES:
-                raise HTTPException(
-                    status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
-                    detail=f"File exceeds {MAX_GEMINI_UPLOAD_MB} MB limit.",
-                )
-            temp_file.write(chunk)
-        return temp_file.name
-    except Exception:
-        temp_path = temp_file.name
-        temp_file.close()
+    digest = hashlib.sha256()
+    size = 0
+    while True:
+        chunk = await upload_file.read(GEMINI_UPLOAD_READ_CHUNK_BYTES)
+        if not chunk:
+            break
+        size += len(chunk)
+        if size > MAX_GEMINI_UPLOAD_BYTES:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=f"File exceeds {MAX_GEMINI_UPLOAD_MB} MB limit.",
+            )
+        digest.update(chunk)
+    await upload_file.seek(0)
+    return upload_file.file, digest.hexdigest(), size
+
+
+def _upload_mime_type(upload_file: UploadFile) -> str:
+    """Resolve the MIME type the SDK needs when it is given a file object, not a path."""
+    if upload_file.content_type:
+        return upload_file.content_type
+    guessed, _ = mimetypes.guess_type(upload_file.filename or "")
+    return guessed or "application/octet-stream"
+
+
+class AttachmentPreprocessor:
+    """Shrink oversized images on a process pool and inline small text files."""
+
+    def __init__(
+        self,
+        max_workers: int,
+        image_min_bytes: int,
+        max_dimension: int,
+        jpeg_quality: int,
+        inline_text_max_bytes: int,
+    ) -> None:
+        self.max_workers = max_workers
+        self.image_min_bytes = image_min_bytes
+        self.max_dimension = max_dimension
+        self.jpeg_quality = jpeg_quality
+        self.inline_text_max_bytes = inline_text_max_bytes
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self.images_processed = 0
+        self.images_reencoded = 0
+        self.bytes_saved = 0
+        self.inline_text_files = 0
+        self.failures = 0
+        self._total_ms = 0.0
+
+    def _pool(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # Spawn fresh interpreters: forking a process that already runs SDK and
+            # executor threads can deadlock, and workers only need media_preprocessing.
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._executor
+
+    async def extract_text(
+        self, source: IO[bytes], size: int, mime_type: str, filename: Optional[str]
+    ) -> Optional[str]:
+        """Return the decoded text of a small text or markdown upload, or None to upload it."""
+        if size > self.inline_text_max_bytes or not is_inline_text(mime_type, filename):
+            return None
+        data = await asyncio.to_thread(source.read)
+        source.seek(0)
+        text = extract_inline_text(data, self.inline_text_max_bytes)
+        if text is not None:
+            self.inline_text_files += 1
+        return text
+
+    async def shrink_image(
+        self, source: IO[bytes], size: int, mime_type: str
+    ) -> Optional[Tuple[bytes, str]]:
+        """Return smaller image bytes and their MIME type, or None to upload the original."""
+        if self.max_workers <= 0 or size < self.image_min_bytes or not is_resizable_image(mime_type):
+            return None
+        data = await asyncio.to_thread(source.read)
+        source.seek(0)
+        started = time.perf_counter()
+        loop = asyncio.get_running_loop()
         try:
-            os.unlink(temp_path)
-        except OSError:
-            pass
-        raise
-    finally:
-        temp_file.close()
+            result = await loop.run_in_executor(
+                self._pool(),
+                downscale_image,
+                data,
+                mime_type,
+                self.max_dimension,
+                self.jpeg_quality,
+            )
+        except Exception as error:  # pragma: no cover - fall back to the original bytes
+            self.failures += 1
+            print(f"Image preprocessing failed: {error}")
+            return None
+        finally:
+            self.images_processed += 1
+            self._total_ms += (time.perf_counter() - started) * 1000
+        if result is not None:
+            self.images_reencoded += 1
+            self.bytes_saved += size - len(result[0])
+        return result
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "image_support": image_preprocessing_available(),
+            "max_workers": self.max_workers,
+            "images_processed": self.images_processed,
+            "images_reencoded": self.images_reencoded,
+            "bytes_saved": self.bytes_saved,
+            "inline_text_files": self.inline_text_files,
+            "failures": self.failures,
+            "avg_image_ms": round(self._total_ms / self.images_processed, 3)
+            if self.images_processed
+            else 0.0,
+        }
+
 
+ATTACHMENT_PREPROCESSOR = AttachmentPreprocessor(
+    max_workers=GEMINI_PREPROCESS_WORKERS,
+    image_min_bytes=GEMINI_IMAGE_PREPROCESS_MIN_KB * 1024,
+    max_dimension=GEMINI_IMAGE_MAX_DIMENSION,
+    jpeg_quality=GEMINI_IMAGE_JPEG_QUALITY,
+    inline_text_max_bytes=GEMINI_INLINE_TEXT_MAX_KB * 1024,
+)
 
-def wait_for_gemini_file_ready(file_resource):
-    """Poll the Gemini API until the uploaded file is ACTIVE."""
-    target_name = getattr(file_resource, "name", None)
-    if not target_name:
-        return file_resource
 
-    start_time = time.time()
-    while True:
-        current = genai.get_file(target_name)
-        state = getattr(current, "state", None)
-        state_name = getattr(state, "name", None) if hasattr(state, "name") else state
-        if isinstance(state_name, str):
-            state_name = state_name.upper()
+def _gemini_file_state(file_obj: Any) -> Optional[str]:
+    state = getattr(file_obj, "state", None)
+    state_name = getattr(state, "name", None) if hasattr(state, "name") else state
+    if isinstance(state_name, str):
+        state_name = state_name.upper()
+    return state_name
+
+
+class _PendingGeminiFile:
+    __slots__ = ("name", "future", "started_at", "deadline", "next_poll_at", "delay", "polls", "errors")
+
+    def __init__(self, name: str, future: asyncio.Future, now: float):
+        self.name = name
+        self.future = future
+        self.started_at = now
+        self.deadline = now + GEMINI_FILE_POLL_TIMEOUT
+        self.delay = GEMINI_FILE_POLL_INTERVAL
+        self.next_poll_at = now + self.delay
+        self.polls = 0
+        self.errors = 0
+
+
+class GeminiFileReadinessTracker:
+    """Wait for uploaded Gemini files to become ACTIVE using a single shared poller task."""
+
+    MAX_CONSECUTIVE_ERRORS = 3
+
+    def __init__(self):
+        self._pending: Dict[str, _PendingGeminiFile] = {}
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.polls = 0
+        self.completed = 0
+        self.failed = 0
+        self.timeouts = 0
+        self._latency_total = 0.0
+        self._latency_max = 0.0
+        self._recent: deque = deque(maxlen=20)
+
+    async def wait_until_active(self, file_resource: Any) -> Any:
+        name = getattr(file_resource, "name", None)
+        if not name or _gemini_file_state(file_resource) == "ACTIVE":
+            return file_resource
+
+        loop = asyncio.get_running_loop()
+        entry = self._pending.get(name)
+        if entry is None:
+            entry = _PendingGeminiFile(name, loop.create_future(), loop.time())
+            self._pending[name] = entry
+        if self._task is None or self._task.done():
+            self._task = loop.create_task(self._run())
+        else:
+            self._wake.set()
+        return await asyncio.shield(entry.future)
+
+    def _finish(self, entry: _PendingGeminiFile, result: Any = None, error: Optional[BaseException] = None) -> None:
+        self._pending.pop(entry.name, None)
+        latency = asyncio.get_running_loop().time() - entry.started_at
+        self._recent.append(
+            {
+                "name": entry.name,
+                "outcome": "active" if error is None else type(error).__name__,
+                "latency_ms": round(latency * 1000, 3),
+                "polls": entry.polls,
+            }
+        )
+        if entry.future.done():
+            return
+        if error is None:
+            self.completed += 1
+            self._latency_total += latency
+            self._latency_max = max(self._latency_max, latency)
+            entry.future.set_result(result)
+        else:
+            entry.future.set_exception(error)
+
+    async def _poll(self, entry: _PendingGeminiFile) -> None:
+        loop = asyncio.get_running_loop()
+        entry.polls += 1
+        self.polls += 1
+        try:
+            current = await asyncio.to_thread(genai.get_file, entry.name)
+        except Exception as error:
+            entry.errors += 1
+            if entry.errors >= self.MAX_CONSECUTIVE_ERRORS:
+                self.failed += 1
+                self._finish(entry, error=error)
+                return
+            current = None
+        else:
+            entry.errors = 0
 
+        state_name = _gemini_file_state(current) if current is not None else None
         if state_name == "ACTIVE":
-            return current
+            self._finish(entry, result=current)
+            return
         if state_name == "FAILED":
-            raise RuntimeError("Gemini file processing failed.")
+            self.failed += 1
+            self._finish(entry, error=RuntimeError("Gemini file processing failed."))
+            return
+
+        now = loop.time()
+        if now >= entry.deadline:
+            self.timeouts += 1
+            self._finish(entry, error=TimeoutError("Timed out waiting for Gemini file to finish processing."))
+            return
+        entry.delay = min(entry.delay * 2, GEMINI_FILE_POLL_MAX_INTERVAL)
+        jittered = entry.delay * random.uniform(0.8, 1.2)
+        entry.next_poll_at = min(now + jittered, entry.deadline)
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while self._pending:
+            now = loop.time()
+            due = [entry for entry in self._pending.values() if entry.next_poll_at <= now]
+            if due:
+                await asyncio.gather(*(self._poll(entry) for entry in due))
+                continue
+            self._wake.clear()
+            next_due = min(entry.next_poll_at for entry in self._pending.values())
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=max(0.0, next_due - now))
+            except asyncio.TimeoutError:
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pending": len(self._pending),
+            "polls": self.polls,
+            "completed": self.completed,
+            "failed": self.failed,
+            "timeouts": self.timeouts,
+            "avg_processing_ms": round(self._latency_total / self.completed * 1000, 3)
+            if self.completed
+            else 0.0,
+            "max_processing_ms": round(self._latency_max * 1000, 3),
+            "recent": list(self._recent),
+        }
 
-        elapsed = time.time() - start_time
-        if elapsed >= GEMINI_FILE_POLL_TIMEOUT:
-            raise TimeoutError("Timed out waiting for Gemini file to finish processing.")
-        time.sleep(GEMINI_FILE_POLL_INTERVAL)
 
+GEMINI_FILE_TRACKER = GeminiFileReadinessTracker()
 
-def upload_file_and_wait(path: str, display_name: Optional[str], mime_type: Optional[str]):
-    """Upload a file to Gemini and wait for processing to complete."""
-    upload_kwargs: Dict[str, Any] = {"path": path}
+
+def _upload_gemini_file(source: Any, display_name: Optional[str], mime_type: Optional[str]):
+    upload_kwargs: Dict[str, Any] = {"path": source}
     if display_name:
         upload_kwargs["display_name"] = display_name
     if mime_type:
         upload_kwargs["mime_type"] = mime_type
+    return genai.upload_file(**upload_kwargs)
 
-    uploaded = genai.upload_file(**upload_kwargs)
-    state = getattr(uploaded, "state", None)
-    state_name = getattr(state, "name", None) if hasattr(state, "name") else state
-    if isinstance(state_name, str) and state_name.upper() == "ACTIVE":
-        return uploaded
-    return wait_for_gemini_file_ready(uploaded)
+
+async def upload_file_and_wait(source: Any, display_name: Optional[str], mime_type: Optional[str]):
+    """Upload a file path or binary file object to Gemini and wait for processing to complete."""
+    uploaded = await asyncio.to_thread(_upload_gemini_file, source, display_name, mime_type)
+    return await GEMINI_FILE_TRACKER.wait_until_active(uploaded)
 
 
 def serialize_gemini_file(file_obj: Any) -> GeminiFile:
@@ -650,11 +1703,6 @@ def serialize_gemini_file(file_obj: Any) -> GeminiFile:
             return None
         return str(value)
 
-    state = getattr(file_obj, "state", None)
-    state_name = getattr(state, "name", None) if hasattr(state, "name") else state
-    if isinstance(state_name, str):
-        state_name = state_name.upper()
-
     return GeminiFile(
         name=getattr(file_obj, "name", ""),
         display_name=getattr(file_obj, "display_name", None),
@@ -665,7 +1713,7 @@ def serialize_gemini_file(file_obj: Any) -> GeminiFile:
             getattr(file_obj, "size_bytes", None)
             or getattr(file_obj, "sizeBytes", None)
         ),
-        state=state_name,
+        state=_gemini_file_state(file_obj),
         create_time=_to_str(
             getattr(file_obj, "create_time", None)
             or getattr(file_obj, "createTime", None)
@@ -674,6 +1722,80 @@ def serialize_gemini_file(file_obj: Any) -> GeminiFile:
             getattr(file_obj, "update_time", None)
             or getattr(file_obj, "updateTime", None)
         ),
+        expiration_time=_to_str(
+            getattr(file_obj, "expiration_time", None)
+            or getattr(file_obj, "expirationTime", None)
+        ),
+    )
+
+
+def _gemini_file_expiry(file_info: GeminiFile) -> datetime:
+    """Return when Gemini will delete the file, as a naive UTC datetime."""
+    if file_info.expiration_time:
+        try:
+            parsed = datetime.fromisoformat(file_info.expiration_time.replace("Z", "+00:00"))
+            if parsed.tzinfo is not None:
+                parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+            return parsed
+        except ValueError:
+            pass
+    return datetime.utcnow() + GEMINI_FILE_LIFETIME
+
+
+async def find_cached_gemini_file(
+    db: databases.Database,
+    content_sha256: str,
+    mime_type: Optional[str],
+    display_name: Optional[str] = None,
+) -> Optional[GeminiFile]:
+    """Return a still-live Gemini file previously uploaded with the same bytes, if any."""
+    record = await db.fetch_one(
+        gemini_file_uploads.select().where(
+            (gemini_file_uploads.c.content_sha256 == content_sha256)
+            & (gemini_file_uploads.c.mime_type == (mime_type or ""))
+        )
+    )
+    if not record or not record["payload"]:
+        return None
+    # Expired (or nearly expired) files are re-uploaded lazily by the caller.
+    if record["expires_at"] is None or record["expires_at"] <= datetime.utcnow() + GEMINI_FILE_REUSE_MARGIN:
+        return None
+    try:
+        cached = GeminiFile(**json.loads(record["payload"]))
+    except (TypeError, ValueError):
+        return None
+    if display_name:
+        cached = cached.copy(update={"display_name": display_name})
+    return cached
+
+
+async def remember_gemini_file(
+    db: databases.Database,
+    content_sha256: str,
+    mime_type: Optional[str],
+    size_bytes: int,
+    file_info: GeminiFile,
+) -> None:
+    """Record the Gemini file for these bytes, replacing any earlier upload of them."""
+    now = datetime.utcnow()
+    payload = {
+        "size_bytes": size_bytes,
+        "gemini_name": file_info.name,
+        "payload": file_info.json(),
+        "expires_at": _gemini_file_expiry(file_info),
+        "updated_at": now,
+    }
+    await upsert_returning(
+        db,
+        gemini_file_uploads,
+        {
+            **payload,
+            "content_sha256": content_sha256,
+            "mime_type": mime_type or "",
+            "created_at": now,
+        },
+        ("content_sha256", "mime_type"),
+        payload,
     )
 
 # Streak helper functions
@@ -683,58 +1805,104 @@ async def get_or_create_user_streak(user_id: int, db: databases.Database) -> Use
     streak = await db.fetch_one(query)
     if not streak:
         # Create new streak record with explicit timestamps
-        from datetime import datetime
         now = datetime.utcnow()
-        create_query = user_streaks.insert().values(
-            user_id=user_id,
-            current_streak=0,
-            last_activity_date=None,
-            created_at=now,
-            updated_at=now
+        streak = await insert_returning(
+            db,
+            user_streaks,
+            {
+                "user_id": user_id,
+                "current_streak": 0,
+                "last_activity_date": None,
+                "created_at": now,
+                "updated_at": now,
+            },
         )
-        streak_id = await db.execute(create_query)
-        select_query = user_streaks.select().where(user_streaks.c.id == streak_id)
-        streak = await db.fetch_one(select_query)
     return streak
 
 async def update_user_streak(user_id: int, db: databases.Database):
     """Update user streak based on daily activity"""
-    from datetime import datetime, date
+    now = datetime.utcnow()
+    today_start = datetime.combine(now.date(), datetime.min.time())
+    yesterday_start = today_start - timedelta(days=1)
+    not_touched_today = (user_streaks.c.user_id == user_id) & (
+        user_streaks.c.last_activity_date.is_(None)
+        | (user_streaks.c.last_activity_date < today_start)
+    )
+    bump = {
+        "current_streak": sqlalchemy.case(
+            (user_streaks.c.last_activity_date >= yesterday_start, user_streaks.c.current_streak + 1),
+            else_=1,
+        ),
+        "last_activity_date": now,
+        "updated_at": now,
+    }
 
-    today = datetime.utcnow().date()
-    streak = await get_or_create_user_streak(user_id, db)
+    streak = await update_returning(db, user_streaks, not_touched_today, bump)
+    if streak is None:
+        # Either already counted today, or the user has no streak row yet.
+        streak = await get_or_create_user_streak(user_id, db)
+        if streak["last_activity_date"] is None:
+            streak = await update_returning(db, user_streaks, not_touched_today, bump) or streak
+    STREAK_TOUCHER.remember(user_id, now.date())
+    return streak
 
-    # Check if last activity was yesterday
-    if streak['last_activity_date']:
-        last_activity = streak['last_activity_date'].date()
-        yesterday = date.fromordinal(today.toordinal() - 1)
-
-        if last_activity == yesterday:
-            # Continue streak
-            new_streak = streak['current_streak'] + 1
-        elif last_activity < yesterday:
-            # Streak broken, start new one
-            new_streak = 1
-        else:
-            # Already updated today
-            return streak
-    else:
-        # First activity ever
-        new_streak = 1
-
-    # Update streak record
-    update_query = user_streaks.update().where(
-        user_streaks.c.user_id == user_id
-    ).values(
-        current_streak=new_streak,
-        last_activity_date=datetime.utcnow()
-    )
-    await db.execute(update_query)
 
-    # Return updated streak
-    select_query = user_streaks.select().where(user_streaks.c.user_id == user_id)
-    updated_streak = await db.fetch_one(select_query)
-    return updated_streak
+class UserStreakToucher:
+    """Bump daily streaks off the request path, at most once per user per UTC day."""
+
+    def __init__(self, max_entries: int) -> None:
+        self.max_entries = max_entries
+        self._touched: "OrderedDict[int, date]" = OrderedDict()
+        self._tasks: set = set()
+        self.skipped = 0
+        self.applied = 0
+        self.failures = 0
+
+    def remember(self, user_id: int, day: date) -> None:
+        if self.max_entries <= 0:
+            return
+        self._touched[user_id] = day
+        self._touched.move_to_end(user_id)
+        while len(self._touched) > self.max_entries:
+            self._touched.popitem(last=False)
+
+    def touch(self, user_id: int, db: databases.Database) -> None:
+        today = datetime.utcnow().date()
+        if self._touched.get(user_id) == today:
+            self.skipped += 1
+            return
+        # Mark first so concurrent turns from the same user do not schedule duplicates.
+        self.remember(user_id, today)
+        task = asyncio.create_task(self._apply(user_id, db))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _apply(self, user_id: int, db: databases.Database) -> None:
+        try:
+            await update_user_streak(user_id, db)
+            self.applied += 1
+        except Exception as error:  # pragma: no cover - best effort logging
+            self.failures += 1
+            self._touched.pop(user_id, None)
+            print(f"Streak update error: {error}")
+
+    async def drain(self) -> None:
+        """Wait for scheduled updates; called on shutdown before the database closes."""
+        if self._tasks:
+            await asyncio.gather(*list(self._tasks), return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "tracked_users": len(self._touched),
+            "max_entries": self.max_entries,
+            "in_flight": len(self._tasks),
+            "skipped": self.skipped,
+            "applied": self.applied,
+            "failures": self.failures,
+        }
+
+
+STREAK_TOUCHER = UserStreakToucher(STREAK_TOUCH_CACHE_SIZE)
 
 # API Routes
 
@@ -742,13 +1910,35 @@ async def update_user_streak(user_id: int, db: databases.Database):
 async def root():
     return {"message": "User Profile API with AI Chat"}
 
+
+@app.get("/metrics")
+async def get_metrics():
+    """Report runtime statistics for the backend's shared resources."""
+    return {
+        "database_pool": database.stats(),
+        "streaming": STREAMING_POOL.stats(),
+        "conversation_cache": CONVERSATION_CACHE.stats(),
+        "conversation_writer": CONVERSATION_WRITER.stats(),
+        "context_builder": CONTEXT_BUILDER.stats(),
+        "chat_titles": TITLE_SERVICE.stats(),
+        "gemini_files": GEMINI_FILE_TRACKER.stats(),
+        "attachment_preprocessing": ATTACHMENT_PREPROCESSOR.stats(),
+        "streak_touches": STREAK_TOUCHER.stats(),
+        "google_calendar_services": GOOGLE_CALENDAR_SERVICES.stats(),
+        "google_tokens": GOOGLE_TOKENS.stats(),
+    }
+
 # AI Chat helper functions
 async def get_or_create_conversation(conversation_id: Optional[str], user_id: int) -> str:
     """Get existing conversation or create new one"""
     if conversation_id and _conversation_store_available():
+        if CONVERSATION_CACHE.contains(conversation_id):
+            return conversation_id
         try:
             # Check if conversation exists
-            result = supabase.table("conversations").select("id, history").eq("id", conversation_id).execute()
+            result = await asyncio.to_thread(
+                lambda: supabase.table(CONVERSATIONS_TABLE).select("id").eq("id", conversation_id).execute()
+            )
             if result.data:
                 return conversation_id
         except Exception as error:
@@ -756,12 +1946,15 @@ async def get_or_create_conversation(conversation_id: Optional[str], user_id: in
 
     if _conversation_store_available():
         try:
-            result = supabase.table("conversations").insert({
-                "title": "New Conversation",
-                "history": []
-            }).execute()
+            result = await asyncio.to_thread(
+                lambda: supabase.table(CONVERSATIONS_TABLE).insert({
+                    "title": "New Conversation",
+                }).execute()
+            )
             if result.data:
-                return result.data[0]["id"]
+                created_id = result.data[0]["id"]
+                CONVERSATION_CACHE.put(created_id, [])
+                return created_id
         except Exception as error:
             _handle_conversation_store_error("Error creating conversation", error)
 
@@ -772,33 +1965,77 @@ async def get_or_create_conversation(conversation_id: Optional[str], user_id: in
         LOCAL_CONVERSATION_STORE.setdefault(candidate_id, [])
     return candidate_id
 
+
+def _message_to_row(message: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "role": message.get("role"),
+        "text": message.get("text"),
+        "attachments": message.get("attachments"),
+    }
+
+
+def _row_to_message(row: Dict[str, Any]) -> Dict[str, Any]:
+    message: Dict[str, Any] = {"role": row.get("role"), "text": row.get("text")}
+    if row.get("attachments"):
+        message["attachments"] = row["attachments"]
+    return message
+
+
 async def save_conversation_message(conversation_id: str, message: Dict[str, Any]):
-    """Save message to conversation history"""
+    """Append a message to the conversation; Supabase writes are batched in the background."""
     if not _conversation_store_available():
         async with LOCAL_CONVERSATION_LOCK:
             history = LOCAL_CONVERSATION_STORE.setdefault(conversation_id, [])
             history.append(message)
         return
 
-    try:
-        # Get current history
-        result = supabase.table("conversations").select("history").eq("id", conversation_id).execute()
-        if result.data:
-            history = result.data[0]["history"] or []
-            history.append(message)
+    # The append RPC assigns sequence numbers under a per-conversation lock, so batched
+    # turns never overwrite each other.
+    CONVERSATION_WRITER.enqueue(conversation_id, message)
+    CONVERSATION_CACHE.append(conversation_id, [message])
 
-            # Update conversation
-            supabase.table("conversations").update({
-                "history": history
-            }).eq("id", conversation_id).execute()
-    except Exception as error:
-        _handle_conversation_store_error("Error saving message", error)
 
+async def load_conversation_history(conversation_id: Optional[str]) -> List[Dict[str, Any]]:
+    """Return the conversation's messages in sequence order."""
+    if not conversation_id:
+        return []
 
-def _format_structured_ai_reply(user_message: str, thinking: str, ai_reply: str) -> str:
-    """Return a response that matches the user/thinking/ai template expected by the client."""
-    user_section = (user_message or "").strip() or "(no message provided)"
-    thinking_section = (thinking or "").strip() or "Considering how to respond helpfully."
+    if not _conversation_store_available():
+        async with LOCAL_CONVERSATION_LOCK:
+            return list(LOCAL_CONVERSATION_STORE.get(conversation_id, []))
+
+    cached = CONVERSATION_CACHE.get(conversation_id)
+    if cached is not None:
+        return cached
+
+    # Flush this conversation first so the store reflects every buffered message.
+    await CONVERSATION_WRITER.flush(conversation_id)
+    if not _conversation_store_available():
+        async with LOCAL_CONVERSATION_LOCK:
+            return list(LOCAL_CONVERSATION_STORE.get(conversation_id, []))
+
+    try:
+        result = await asyncio.to_thread(
+            lambda: supabase.table(CONVERSATION_MESSAGES_TABLE)
+            .select("seq, role, text, attachments")
+            .eq("conversation_id", conversation_id)
+            .order("seq")
+            .execute()
+        )
+        history = [_row_to_message(row) for row in result.data or []]
+        # Anything still buffered here failed to flush and is not in the store yet.
+        history.extend(CONVERSATION_WRITER.pending_messages(conversation_id))
+        CONVERSATION_CACHE.put(conversation_id, history)
+        return history
+    except Exception as error:
+        _handle_conversation_store_error("Error getting conversation history", error)
+        return CONVERSATION_WRITER.pending_messages(conversation_id)
+
+
+def _format_structured_ai_reply(user_message: str, thinking: str, ai_reply: str) -> str:
+    """Return a response that matches the user/thinking/ai template expected by the client."""
+    user_section = (user_message or "").strip() or "(no message provided)"
+    thinking_section = (thinking or "").strip() or "Considering how to respond helpfully."
     ai_section = (ai_reply or "").strip() or "Let me know how I can assist further."
     return "\n\n".join(
         [
@@ -808,6 +2045,21 @@ def _format_structured_ai_reply(user_message: str, thinking: str, ai_reply: str)
         ]
     )
 
+async def run_gemini_call(
+    func,
+    *args,
+    timeout: float = GEMINI_REQUEST_TIMEOUT,
+    executor: ThreadPoolExecutor = GEMINI_EXECUTOR,
+    **kwargs,
+):
+    """Run a blocking Gemini SDK call on the dedicated executor, bounded by ``timeout`` seconds."""
+    loop = asyncio.get_running_loop()
+    return await asyncio.wait_for(
+        loop.run_in_executor(executor, functools.partial(func, *args, **kwargs)),
+        timeout=timeout,
+    )
+
+
 async def generate_chat_title_suggestion(message: str) -> Optional[str]:
     """Generate a concise chat title using Gemini Flash Lite."""
     trimmed = (message or "").strip()
@@ -824,7 +2076,11 @@ async def generate_chat_title_suggestion(message: str) -> Optional[str]:
     )
 
     try:
-        response = gemini_title_model.generate_content(prompt)
+        response = await run_gemini_call(
+            gemini_title_model.generate_content,
+            prompt,
+            timeout=GEMINI_TITLE_TIMEOUT,
+        )
         text_response = getattr(response, "text", None) or ""
         if not text_response:
             candidates = getattr(response, "candidates", None) or []
@@ -853,29 +2109,361 @@ async def generate_chat_title_suggestion(message: str) -> Optional[str]:
             return None
         # Cap overly long results to keep sidebar tidy
         return normalized[:80].strip()
+    except asyncio.TimeoutError:
+        print(f"Gemini title generation timed out after {GEMINI_TITLE_TIMEOUT}s")
+        return None
     except Exception as error:  # pragma: no cover - best effort logging
         print(f"Gemini title generation error: {error}")
         return None
 
 
+class ChatTitleService:
+    """Memoize title suggestions and collapse concurrent requests for the same message."""
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._cache: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key_for(message: str) -> Optional[str]:
+        normalized = " ".join((message or "").lower().split()).rstrip(" .!?")
+        if not normalized:
+            return None
+        return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+    def _lookup(self, key: str) -> Optional[str]:
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            del self._cache[key]
+            return None
+        self._cache.move_to_end(key)
+        return entry[1]
+
+    def _store(self, key: str, title: str) -> None:
+        if self.max_entries <= 0:
+            return
+        self._cache[key] = (time.monotonic() + self.ttl, title)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+            self.evictions += 1
+
+    async def _generate(self, key: str, message: str) -> Optional[str]:
+        try:
+            title = await generate_chat_title_suggestion(message)
+            if title:
+                self._store(key, title)
+            return title
+        finally:
+            self._inflight.pop(key, None)
+
+    async def suggest(self, message: str) -> Optional[str]:
+        key = self.key_for(message)
+        if key is None:
+            return None
+
+        cached = self._lookup(key)
+        if cached is not None:
+            self.hits += 1
+            return cached
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+            task = asyncio.create_task(self._generate(key, message))
+            self._inflight[key] = task
+        # Shield the shared call so one disconnected caller does not cancel it for the others.
+        return await asyncio.shield(task)
+
+    def stats(self) -> Dict[str, Any]:
+        requests = self.hits + self.misses + self.coalesced
+        return {
+            "entries": len(self._cache),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._inflight),
+            "hit_rate": round((self.hits + self.coalesced) / requests, 4) if requests else 0.0,
+            "evictions": self.evictions,
+        }
+
+
+TITLE_SERVICE = ChatTitleService(CHAT_TITLE_CACHE_SIZE, CHAT_TITLE_CACHE_TTL)
+
+
+# Gemini bills an image or file part at a flat rate of roughly this many tokens.
+ATTACHMENT_TOKEN_ESTIMATE = 258
+
+
+def _estimate_tokens(text: Optional[str]) -> int:
+    """Approximate token count (about four characters per token) without an API round trip."""
+    return (len(text) + 3) // 4 if text else 0
+
+
+def _history_fingerprint(entry: Dict[str, Any]) -> Tuple[Any, ...]:
+    text = entry.get("text") or ""
+    return (entry.get("role"), len(text), hash(text), len(entry.get("attachments") or []))
+
+
+def _build_entry_parts(entry: Dict[str, Any]) -> List[Dict[str, Any]]:
+    parts: List[Dict[str, Any]] = []
+    for attachment in entry.get("attachments") or []:
+        if not attachment:
+            continue
+        if isinstance(attachment, dict):
+            uri = attachment.get("uri")
+            mime_type = attachment.get("mime_type")
+            inline_text = attachment.get("text")
+            label = attachment.get("display_name") or attachment.get("name")
+        else:
+            uri = getattr(attachment, "uri", None)
+            mime_type = getattr(attachment, "mime_type", None)
+            inline_text = getattr(attachment, "text", None)
+            label = getattr(attachment, "display_name", None) or getattr(attachment, "name", None)
+        if inline_text:
+            parts.append({"text": f"Attached file {label or 'attachment'}:\n{inline_text}"})
+        elif uri and mime_type:
+            parts.append(
+                {
+                    "file_data": {
+                        "file_uri": uri,
+                        "mime_type": mime_type,
+                    }
+                }
+            )
+    text = entry.get("text")
+    if text:
+        parts.append({"text": text})
+    return parts
+
+
+def _summary_line(entry: Dict[str, Any], max_chars: int = 200) -> str:
+    role = "User" if entry.get("role") == "user" else "Assistant"
+    text = entry.get("text") or ""
+    if role == "Assistant":
+        text = _extract_ai_section(text)
+    text = " ".join(text.split())
+    if len(text) > max_chars:
+        text = f"{text[:max_chars - 1].rstrip()}…"
+    return f"- {role}: {text}" if text else ""
+
+
+class ConversationContextBuilder:
+    """Fit conversation history into a token budget, summarizing turns that fall outside it."""
+
+    def __init__(self, token_budget: int, summary_budget: int, max_conversations: int):
+        self.token_budget = token_budget
+        self.summary_budget = summary_budget
+        self.max_conversations = max_conversations
+        self._prepared: "OrderedDict[str, List[Tuple[Tuple[Any, ...], Optional[Dict[str, Any]], int]]]" = OrderedDict()
+        self._summaries: "OrderedDict[str, Tuple[int, str]]" = OrderedDict()
+        self._refreshing: Dict[str, asyncio.Task] = {}
+        self.entries_reused = 0
+        self.entries_built = 0
+        self.summary_refreshes = 0
+
+    def _remember(self, store: OrderedDict, conversation_id: str, value: Any) -> None:
+        store[conversation_id] = value
+        store.move_to_end(conversation_id)
+        while len(store) > self.max_conversations:
+            store.popitem(last=False)
+
+    def _prepare_entries(
+        self, conversation_id: Optional[str], history: List[Dict[str, Any]]
+    ) -> List[Tuple[Tuple[Any, ...], Optional[Dict[str, Any]], int]]:
+        prepared: List[Tuple[Tuple[Any, ...], Optional[Dict[str, Any]], int]] = []
+        cached = self._prepared.get(conversation_id) if conversation_id else None
+        if cached:
+            # Histories are append-only, so a matching last entry means the whole prefix matches.
+            reuse = min(len(cached), len(history))
+            if reuse and cached[reuse - 1][0] == _history_fingerprint(history[reuse - 1]):
+                prepared = cached[:reuse]
+                self.entries_reused += reuse
+
+        for entry in history[len(prepared):]:
+            parts = _build_entry_parts(entry)
+            content = None
+            tokens = 0
+            if parts:
+                role = "user" if entry.get("role") == "user" else "model"
+                content = {"role": role, "parts": parts}
+                file_parts = sum(1 for part in parts if "file_data" in part)
+                text_tokens = sum(_estimate_tokens(part.get("text")) for part in parts)
+                tokens = text_tokens + ATTACHMENT_TOKEN_ESTIMATE * file_parts
+            prepared.append((_history_fingerprint(entry), content, tokens))
+            self.entries_built += 1
+
+        if conversation_id and self.max_conversations > 0:
+            self._remember(self._prepared, conversation_id, prepared)
+        return prepared
+
+    def _extend_summary(self, summary: str, entries: List[Dict[str, Any]]) -> str:
+        lines = [line for line in (_summary_line(entry) for entry in entries) if line]
+        combined = "\n".join(([summary] if summary else []) + lines)
+        max_chars = self.summary_budget * 4
+        if len(combined) > max_chars:
+            # Keep the most recent part of the digest; it matters most for the next reply.
+            combined = "…" + combined[-(max_chars - 1):]
+        return combined
+
+    def _summary_for(self, conversation_id: Optional[str], history: List[Dict[str, Any]], upto: int) -> str:
+        covered, summary = (0, "")
+        if conversation_id and conversation_id in self._summaries:
+            covered, summary = self._summaries[conversation_id]
+            self._summaries.move_to_end(conversation_id)
+        if covered > upto:
+            # The window grew back over summarized turns; rebuild instead of repeating them.
+            covered, summary = 0, ""
+        if covered == upto:
+            return summary
+
+        extended = self._extend_summary(summary, history[covered:upto])
+        if conversation_id:
+            if not self._schedule_refresh(conversation_id, summary, history[covered:upto], upto):
+                self._remember(self._summaries, conversation_id, (upto, extended))
+        return extended
+
+    def _schedule_refresh(
+        self,
+        conversation_id: str,
+        previous: str,
+        entries: List[Dict[str, Any]],
+        upto: int,
+    ) -> bool:
+        if not (gemini_title_model and GEMINI_API_KEY):
+            return False
+        if conversation_id in self._refreshing:
+            return True
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return False
+        self._refreshing[conversation_id] = loop.create_task(
+            self._refresh_summary(conversation_id, previous, entries, upto)
+        )
+        return True
+
+    async def _refresh_summary(
+        self,
+        conversation_id: str,
+        previous: str,
+        entries: List[Dict[str, Any]],
+        upto: int,
+    ) -> None:
+        transcript = "\n".join(line for line in (_summary_line(entry, 1000) for entry in entries) if line)
+        prompt = (
+            "Update the running summary of a conversation between a user and an AI assistant. "
+            f"Keep facts, decisions, names and open questions. Stay under {self.summary_budget * 3 // 4} words "
+            "and reply with the summary only.\n\n"
+            f"Current summary:\n{previous or '(none)'}\n\nNew turns:\n{transcript}"
+        )
+        summary = ""
+        try:
+            response = await run_gemini_call(
+                gemini_title_model.generate_content,
+                prompt,
+                timeout=GEMINI_TITLE_TIMEOUT,
+                executor=GEMINI_SUMMARY_EXECUTOR,
+            )
+            summary = _extract_response_text(response).strip()[: self.summary_budget * 4]
+        except Exception as error:  # pragma: no cover - best effort logging
+            print(f"Conversation summary error: {error}")
+        finally:
+            self._refreshing.pop(conversation_id, None)
+        self.summary_refreshes += 1
+        self._remember(
+            self._summaries,
+            conversation_id,
+            (upto, summary or self._extend_summary(previous, entries)),
+        )
+
+    def build(
+        self, conversation_id: Optional[str], history: List[Dict[str, Any]]
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Return the contents that fit the budget and a summary of the older turns, if any."""
+        prepared = self._prepare_entries(conversation_id, history)
+        start = len(prepared)
+        used = 0
+        while start > 0:
+            tokens = prepared[start - 1][2]
+            # The newest turn is always sent, even if it alone exceeds the budget.
+            if start < len(prepared) and used + tokens > self.token_budget:
+                break
+            used += tokens
+            start -= 1
+        # The window must open on a user turn; leading model turns go into the summary instead.
+        while start < len(prepared) - 1 and (prepared[start][1] or {}).get("role") != "user":
+            start += 1
+
+        contents = [content for _, content, _ in prepared[start:] if content]
+        summary = self._summary_for(conversation_id, history, start) if start else None
+        return contents, summary or None
+
+    async def shutdown(self) -> None:
+        """Cancel background summary rewrites that are still running."""
+        tasks = list(self._refreshing.values())
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        # Tasks cancelled before they first ran never reach their own cleanup.
+        self._refreshing.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "token_budget": self.token_budget,
+            "summary_budget": self.summary_budget,
+            "conversations": len(self._prepared),
+            "summaries": len(self._summaries),
+            "summary_refreshes": self.summary_refreshes,
+            "summaries_in_flight": len(self._refreshing),
+            "entries_reused": self.entries_reused,
+            "entries_built": self.entries_built,
+        }
+
+
+CONTEXT_BUILDER = ConversationContextBuilder(
+    GEMINI_CONTEXT_TOKEN_BUDGET,
+    GEMINI_SUMMARY_TOKEN_BUDGET,
+    CONVERSATION_CACHE_SIZE,
+)
+
+
 def _prepare_gemini_contents(
     message: str,
     conversation_history: Optional[List[Dict[str, Any]]] = None,
     workspace_context: Optional[str] = None,
     system_prompt: Optional[str] = None,
     attachments: Optional[List[GeminiAttachment]] = None,
+    conversation_id: Optional[str] = None,
 ) -> List[Dict[str, Any]]:
     """Build the Gemini content payload shared by streaming and non-streaming calls."""
-    history: List[Dict[str, Any]] = list((conversation_history or [])[-10:])
+    history: List[Dict[str, Any]] = list(conversation_history or [])
     include_current = True
     if history:
         last_entry = history[-1]
         if last_entry.get("role") == "user" and last_entry.get("text") == message:
             include_current = False
             if attachments and not last_entry.get("attachments"):
-                last_entry["attachments"] = [
-                    attachment.dict(exclude_none=True) for attachment in attachments
-                ]
+                # Copy rather than mutate: history entries may be shared with the cache.
+                history[-1] = {
+                    **last_entry,
+                    "attachments": [
+                        attachment.dict(exclude_none=True) for attachment in attachments
+                    ],
+                }
     if include_current:
         history.append(
             {
@@ -889,30 +2477,7 @@ def _prepare_gemini_contents(
             }
         )
 
-    def build_parts(entry: Dict[str, Any]) -> List[Dict[str, Any]]:
-        parts: List[Dict[str, Any]] = []
-        for attachment in entry.get("attachments") or []:
-            if not attachment:
-                continue
-            if isinstance(attachment, dict):
-                uri = attachment.get("uri")
-                mime_type = attachment.get("mime_type")
-            else:
-                uri = getattr(attachment, "uri", None)
-                mime_type = getattr(attachment, "mime_type", None)
-            if uri and mime_type:
-                parts.append(
-                    {
-                        "file_data": {
-                            "file_uri": uri,
-                            "mime_type": mime_type,
-                        }
-                    }
-                )
-        text = entry.get("text")
-        if text:
-            parts.append({"text": text})
-        return parts
+    history_contents, summary = CONTEXT_BUILDER.build(conversation_id, history)
 
     contents: List[Dict[str, Any]] = []
     system_parts: List[str] = []
@@ -924,6 +2489,8 @@ def _prepare_gemini_contents(
         trimmed_context = workspace_context.strip()
         if trimmed_context:
             system_parts.append(f"Workspace context:\n{trimmed_context}")
+    if summary:
+        system_parts.append(f"Summary of the earlier conversation:\n{summary}")
     if system_parts:
         contents.append(
             {
@@ -932,12 +2499,7 @@ def _prepare_gemini_contents(
             }
         )
 
-    for entry in history:
-        parts = build_parts(entry)
-        if not parts:
-            continue
-        role = "user" if entry.get("role") == "user" else "model"
-        contents.append({"role": role, "parts": parts})
+    contents.extend(history_contents)
 
     if not contents:
         contents.append({"role": "user", "parts": [{"text": message}]})
@@ -966,12 +2528,133 @@ def _extract_response_text(candidate: Any) -> str:
     return ""
 
 
+class StreamingCapacityError(RuntimeError):
+    """Raised when every streaming worker stays busy past the admission timeout."""
+
+
+class _StreamFailure:
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+_STREAM_DONE = object()
+
+
+class StreamingWorkerPool:
+    """Fixed-size thread pool for blocking streaming calls, with a bounded queue per stream."""
+
+    def __init__(self, max_workers: int, queue_size: int, acquire_timeout: float):
+        self.max_workers = max_workers
+        self.queue_size = queue_size
+        self.acquire_timeout = acquire_timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="gemini-stream")
+        self._slots = asyncio.Semaphore(max_workers)
+        self._queues: set = set()
+        self._active = 0
+        self._waiting = 0
+        self._started_total = 0
+        self._rejected_total = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def _release(self) -> None:
+        self._active -= 1
+        self._slots.release()
+
+    async def stream(self, produce: Callable[[Callable[[Any], bool]], None]) -> AsyncGenerator[Any, None]:
+        """Run ``produce(emit)`` on a worker thread and yield every item it emits."""
+        started = time.perf_counter()
+        self._waiting += 1
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout=self.acquire_timeout)
+        except asyncio.TimeoutError as exc:
+            self._rejected_total += 1
+            raise StreamingCapacityError("All streaming workers are busy. Please retry shortly.") from exc
+        finally:
+            self._waiting -= 1
+
+        waited = time.perf_counter() - started
+        self._wait_total += waited
+        self._wait_max = max(self._wait_max, waited)
+        self._started_total += 1
+        self._active += 1
+
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        cancelled = threading.Event()
+
+        def emit(item: Any) -> bool:
+            # Returns False once the consumer has gone away so the producer can stop early.
+            if cancelled.is_set():
+                return False
+            asyncio.run_coroutine_threadsafe(queue.put(item), loop).result()
+            return not cancelled.is_set()
+
+        def run() -> None:
+            try:
+                produce(emit)
+            except BaseException as error:
+                emit(_StreamFailure(error))
+            finally:
+                emit(_STREAM_DONE)
+                loop.call_soon_threadsafe(self._release)
+
+        self._queues.add(queue)
+        try:
+            loop.run_in_executor(self._executor, run)
+        except BaseException:
+            self._queues.discard(queue)
+            self._release()
+            raise
+
+        try:
+            while True:
+                item = await queue.get()
+                if item is _STREAM_DONE:
+                    break
+                if isinstance(item, _StreamFailure):
+                    raise item.error
+                yield item
+        finally:
+            cancelled.set()
+            self._queues.discard(queue)
+            # Free space so a producer blocked in emit() wakes up and sees the cancellation.
+            while not queue.empty():
+                queue.get_nowait()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_workers": self.max_workers,
+            "active_streams": self._active,
+            "waiting": self._waiting,
+            "queue_capacity": self.queue_size,
+            "queued_items": sum(queue.qsize() for queue in self._queues),
+            "started_total": self._started_total,
+            "rejected_total": self._rejected_total,
+            "avg_wait_ms": round(self._wait_total / self._started_total * 1000, 3)
+            if self._started_total
+            else 0.0,
+            "max_wait_ms": round(self._wait_max * 1000, 3),
+        }
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+STREAMING_POOL = StreamingWorkerPool(
+    GEMINI_STREAM_WORKERS,
+    GEMINI_STREAM_QUEUE_SIZE,
+    GEMINI_STREAM_ACQUIRE_TIMEOUT,
+)
+
+
 async def stream_ai_response(
     message: str,
     conversation_history: Optional[List[Dict[str, Any]]] = None,
     workspace_context: Optional[str] = None,
     system_prompt: Optional[str] = None,
     attachments: Optional[List[GeminiAttachment]] = None,
+    conversation_id: Optional[str] = None,
 ) -> AsyncGenerator[Tuple[str, str], None]:
     """Stream Gemini response chunks, falling back to the legacy flow if streaming fails."""
     if gemini_model and GEMINI_API_KEY:
@@ -982,47 +2665,27 @@ async def stream_ai_response(
                 workspace_context,
                 system_prompt,
                 attachments,
+                conversation_id,
             )
-            loop = asyncio.get_running_loop()
-            queue: asyncio.Queue[Tuple[str, Any]] = asyncio.Queue()
 
-            def push(item: Tuple[str, Any]):
-                asyncio.run_coroutine_threadsafe(queue.put(item), loop)
-
-            def worker():
+            def worker(emit: Callable[[Tuple[str, Any]], bool]) -> None:
+                response = gemini_model.generate_content(contents, stream=True)
+                for chunk in response:
+                    delta = _extract_response_text(chunk)
+                    if delta and not emit(("delta", delta)):
+                        return
                 try:
-                    response = gemini_model.generate_content(contents, stream=True)
-                    for chunk in response:
-                        delta = _extract_response_text(chunk)
-                        if not delta:
-                            continue
-                        for piece in _chunk_response_text(delta):
-                            if piece:
-                                push(("delta", piece))
-                    try:
-                        response.resolve()
-                    except Exception:
-                        pass
-                    final_text = _extract_response_text(response)
-                    push(("final", final_text or ""))
-                except Exception as worker_error:
-                    push(("error", worker_error))
-                finally:
-                    push(("stop", ""))
-
-            threading.Thread(target=worker, daemon=True).start()
-
-            while True:
-                kind, payload = await queue.get()
-                if kind == "delta":
-                    yield ("delta", payload)
-                elif kind == "final":
-                    yield ("final", payload)
-                elif kind == "error":
-                    raise payload
-                elif kind == "stop":
-                    break
+                    response.resolve()
+                except Exception:
+                    pass
+                final_text = _extract_response_text(response)
+                emit(("final", final_text or ""))
+
+            async for kind, payload in STREAMING_POOL.stream(worker):
+                yield (kind, payload)
             return
+        except StreamingCapacityError:
+            raise
         except Exception as streaming_error:
             print(f"Gemini streaming error: {streaming_error}")
 
@@ -1032,20 +2695,96 @@ async def stream_ai_response(
         workspace_context=workspace_context,
         system_prompt=system_prompt,
         attachments=attachments,
+        conversation_id=conversation_id,
     )
     visible = _extract_ai_section(fallback_response)
-    for fragment in _chunk_response_text(visible):
-        if fragment:
-            yield ("delta", fragment)
+    if visible:
+        yield ("delta", visible)
     yield ("final", fallback_response)
 
 
+async def coalesce_stream_deltas(
+    source: AsyncGenerator[Tuple[str, Any], None],
+    window: float = STREAMING_FRAME_WINDOW,
+    max_bytes: int = STREAMING_FRAME_MAX_BYTES,
+) -> AsyncGenerator[Tuple[str, Any], None]:
+    """Merge consecutive deltas into frames bounded by a time window and a byte budget."""
+    queue: asyncio.Queue = asyncio.Queue(maxsize=GEMINI_STREAM_QUEUE_SIZE)
+
+    async def pump() -> None:
+        try:
+            async for item in source:
+                await queue.put(item)
+        except Exception as error:
+            await queue.put(_StreamFailure(error))
+            return
+        await queue.put(_STREAM_DONE)
+
+    loop = asyncio.get_running_loop()
+    pump_task = asyncio.create_task(pump())
+    pending: List[str] = []
+    pending_bytes = 0
+    frame_deadline = 0.0
+    sent_first = False
+    try:
+        while True:
+            if pending and (pending_bytes >= max_bytes or loop.time() >= frame_deadline):
+                yield ("delta", "".join(pending))
+                pending, pending_bytes = [], 0
+                continue
+
+            if pending:
+                try:
+                    item = await asyncio.wait_for(queue.get(), timeout=frame_deadline - loop.time())
+                except asyncio.TimeoutError:
+                    continue
+            else:
+                item = await queue.get()
+
+            if item is _STREAM_DONE:
+                break
+            if isinstance(item, _StreamFailure):
+                raise item.error
+
+            kind, payload = item
+            if kind != "delta":
+                if pending:
+                    yield ("delta", "".join(pending))
+                    pending, pending_bytes = [], 0
+                yield item
+                continue
+            if not payload:
+                continue
+
+            if not sent_first:
+                sent_first = True
+                yield item
+                continue
+            if not pending:
+                frame_deadline = loop.time() + window
+            pending.append(payload)
+            pending_bytes += len(payload.encode("utf-8"))
+
+        if pending:
+            yield ("delta", "".join(pending))
+    finally:
+        # On disconnect, stop the pump and close the source explicitly so the worker pool
+        # is told to stop now rather than whenever the generator is garbage collected.
+        pump_task.cancel()
+        try:
+            await pump_task
+        except asyncio.CancelledError:
+            pass
+        await source.aclose()
+
+
 async def generate_ai_response(
     message: str,
     conversation_history: List[Dict[str, Any]] = None,
     workspace_context: Optional[str] = None,
     system_prompt: Optional[str] = None,
     attachments: Optional[List[GeminiAttachment]] = None,
+    conversation_id: Optional[str] = None,
 ) -> str:
     """Generate AI response using Gemini or fallback"""
     if gemini_model and GEMINI_API_KEY:
@@ -1056,11 +2795,14 @@ async def generate_ai_response(
                 workspace_context,
                 system_prompt,
                 attachments,
+                conversation_id,
             )
-            response = gemini_model.generate_content(contents)
+            response = await run_gemini_call(gemini_model.generate_content, contents)
             extracted = _extract_response_text(response)
             if extracted:
                 return extracted
+        except asyncio.TimeoutError:
+            print(f"Gemini API timed out after {GEMINI_REQUEST_TIMEOUT}s")
         except Exception as e:
             print(f"Gemini API error: {e}")
 
@@ -1087,13 +2829,11 @@ async def generate_ai_response(
             "That's a great question! Here's what comes to mind...",
         ),
     ]
-    import random
     thinking, reply_text = random.choice(fallback_options)
     return _format_structured_ai_reply(message, thinking, reply_text)
 
 
 AI_SECTION_PATTERN = re.compile(r"ai:\s*(.*)$", re.IGNORECASE | re.DOTALL)
-TOKEN_SPLIT_REGEX = re.compile(r"(\s+)")
 
 
 def _extract_ai_section(structured_text: str) -> str:
@@ -1106,26 +2846,69 @@ def _extract_ai_section(structured_text: str) -> str:
     return structured_text
 
 
-def _chunk_response_text(text: str, max_chunk_size: int = 48):
-    """Yield small chunks from the response text to simulate token-level streaming."""
-    if not text:
-        return
+def _sse_event(event: str, payload: Dict[str, Any]) -> bytes:
+    """Serialize an SSE event into a ready-to-write frame."""
+    data = json.dumps(payload, separators=(",", ":"))
+    return f"event: {event}\ndata: {data}\n\n".encode("utf-8")
 
-    for fragment in TOKEN_SPLIT_REGEX.split(text):
-        if not fragment:
-            continue
-        if fragment.isspace():
-            yield fragment
-            continue
-        start = 0
-        while start < len(fragment):
-            yield fragment[start:start + max_chunk_size]
-            start += max_chunk_size
 
+async def process_gemini_upload(
+    db: databases.Database,
+    file: UploadFile,
+    display_name: Optional[str] = None,
+) -> GeminiFile:
+    """Spool, deduplicate and upload one file, returning its ACTIVE Gemini metadata."""
+    source, content_sha256, size_bytes = await spool_upload_file(file)
+    mime_type = _upload_mime_type(file)
+    inline_text = await ATTACHMENT_PREPROCESSOR.extract_text(
+        source, size_bytes, mime_type, file.filename
+    )
+    if inline_text is not None:
+        return GeminiFile(
+            name=f"inline/{content_sha256}",
+            display_name=display_name or file.filename,
+            mime_type=mime_type,
+            size_bytes=size_bytes,
+            state="ACTIVE",
+            text=inline_text,
+        )
+
+    try:
+        cached_file = await find_cached_gemini_file(
+            db, content_sha256, mime_type, display_name or file.filename
+        )
+    except Exception as error:  # pragma: no cover - the index is an optimization only
+        print(f"Gemini file index lookup failed: {error}")
+        cached_file = None
+    if cached_file is not None:
+        return cached_file
+
+    upload_source: Any = source
+    upload_mime_type = mime_type
+    shrunk = await ATTACHMENT_PREPROCESSOR.shrink_image(source, size_bytes, mime_type)
+    if shrunk is not None:
+        upload_source = io.BytesIO(shrunk[0])
+        upload_mime_type = shrunk[1]
+
+    try:
+        processed_file = await upload_file_and_wait(
+            upload_source,
+            display_name or file.filename,
+            upload_mime_type,
+        )
+    except HTTPException:
+        raise
+    except TimeoutError as exc:
+        raise HTTPException(status_code=504, detail=str(exc)) from exc
+    except Exception as exc:  # pragma: no cover - best effort logging
+        raise HTTPException(status_code=500, detail=f"Gemini upload failed: {exc}") from exc
 
-def _sse_event(event: str, payload: Dict[str, Any]) -> str:
-    """Serialize an SSE event."""
-    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+    file_info = serialize_gemini_file(processed_file)
+    try:
+        await remember_gemini_file(db, content_sha256, mime_type, size_bytes, file_info)
+    except Exception as error:  # pragma: no cover - the index is an optimization only
+        print(f"Gemini file index update failed: {error}")
+    return file_info
 
 
 # Gemini file endpoints
@@ -1133,32 +2916,67 @@ def _sse_event(event: str, payload: Dict[str, Any]) -> str:
 async def upload_media_file(
     file: UploadFile = File(...),
     display_name: Optional[str] = Form(None),
+    db: databases.Database = Depends(get_database),
 ):
     """Upload a media file to Gemini and return the processed metadata."""
     if not GEMINI_API_KEY:
         raise HTTPException(status_code=400, detail="Gemini API key is not configured.")
 
-    temp_path = await persist_upload_file(file)
-    try:
-        processed_file = await asyncio.to_thread(
-            upload_file_and_wait,
-            temp_path,
-            display_name or file.filename,
-            file.content_type,
+    return await process_gemini_upload(db, file, display_name)
+
+
+@app.post("/api/files/upload/batch")
+async def upload_media_files(
+    files: List[UploadFile] = File(...),
+    db: databases.Database = Depends(get_database),
+):
+    """Upload several media files to Gemini concurrently, streaming results as SSE events."""
+    if not GEMINI_API_KEY:
+        raise HTTPException(status_code=400, detail="Gemini API key is not configured.")
+    if len(files) > GEMINI_UPLOAD_BATCH_MAX_FILES:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"A batch may contain at most {GEMINI_UPLOAD_BATCH_MAX_FILES} files.",
         )
-    except HTTPException:
-        raise
-    except TimeoutError as exc:
-        raise HTTPException(status_code=504, detail=str(exc)) from exc
-    except Exception as exc:  # pragma: no cover - best effort logging
-        raise HTTPException(status_code=500, detail=f"Gemini upload failed: {exc}") from exc
-    finally:
-        try:
-            os.unlink(temp_path)
-        except OSError:
-            pass
 
-    return serialize_gemini_file(processed_file)
+    semaphore = asyncio.Semaphore(GEMINI_UPLOAD_BATCH_CONCURRENCY)
+
+    async def upload_one(index: int, upload: UploadFile) -> Dict[str, Any]:
+        result: Dict[str, Any] = {"index": index, "filename": upload.filename}
+        async with semaphore:
+            try:
+                file_info = await process_gemini_upload(db, upload)
+            except HTTPException as exc:
+                result.update(status_code=exc.status_code, error=str(exc.detail))
+            except Exception as exc:  # pragma: no cover - best effort logging
+                result.update(status_code=500, error=f"Gemini upload failed: {exc}")
+            else:
+                result.update(status_code=200, file=file_info.dict())
+        return result
+
+    async def event_stream() -> AsyncGenerator[bytes, None]:
+        tasks = [asyncio.create_task(upload_one(index, upload)) for index, upload in enumerate(files)]
+        succeeded = 0
+        try:
+            for next_result in asyncio.as_completed(tasks):
+                result = await next_result
+                if "file" in result:
+                    succeeded += 1
+                yield _sse_event("file", result)
+            yield _sse_event(
+                "end",
+                {"total": len(tasks), "succeeded": succeeded, "failed": len(tasks) - succeeded},
+            )
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    headers = {
+        "Cache-Control": "no-cache",
+        "Connection": "keep-alive",
+        "X-Accel-Buffering": "no",
+    }
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers=headers)
 
 
 # AI Chat endpoints
@@ -1167,7 +2985,7 @@ async def create_chat_title(request: ChatTitleRequest):
     """Generate a chat title suggestion using Gemini Flash Lite."""
     suggestion: Optional[str] = None
     try:
-        suggestion = await generate_chat_title_suggestion(request.message)
+        suggestion = await TITLE_SERVICE.suggest(request.message)
     except Exception as error:  # pragma: no cover - best effort logging
         print(f"Title generation error: {error}")
     if suggestion:
@@ -1195,17 +3013,7 @@ async def chat_with_ai(request: ChatRequest, db: databases.Database = Depends(ge
         await save_conversation_message(conversation_id, user_message_payload)
 
         # Get conversation history for context
-        conversation_history = []
-        if _conversation_store_available() and conversation_id:
-            try:
-                result = supabase.table("conversations").select("history").eq("id", conversation_id).execute()
-                if result.data:
-                    conversation_history = result.data[0]["history"] or []
-            except Exception as error:
-                _handle_conversation_store_error("Error getting conversation history", error)
-        elif conversation_id:
-            async with LOCAL_CONVERSATION_LOCK:
-                conversation_history = list(LOCAL_CONVERSATION_STORE.get(conversation_id, []))
+        conversation_history = await load_conversation_history(conversation_id)
 
         # Generate AI response
         ai_response = await generate_ai_response(
@@ -1214,6 +3022,7 @@ async def chat_with_ai(request: ChatRequest, db: databases.Database = Depends(ge
             request.context,
             request.system_prompt,
             request.attachments,
+            conversation_id,
         )
 
         # Save AI response
@@ -1223,7 +3032,7 @@ async def chat_with_ai(request: ChatRequest, db: databases.Database = Depends(ge
         })
 
         # Update user streak for daily activity
-        await update_user_streak(request.user_id, db)
+        STREAK_TOUCHER.touch(request.user_id, db)
 
         return ChatResponse(response=ai_response, conversation_id=conversation_id)
 
@@ -1248,44 +3057,31 @@ async def chat_with_ai_stream(request: ChatRequest, db: databases.Database = Dep
 
         await save_conversation_message(conversation_id, user_message_payload)
 
-        conversation_history: List[Dict[str, Any]] = []
-        if _conversation_store_available() and conversation_id:
-            try:
-                result = supabase.table("conversations").select("history").eq("id", conversation_id).execute()
-                if result.data:
-                    conversation_history = result.data[0]["history"] or []
-            except Exception as supabase_error:  # pragma: no cover - logging
-                _handle_conversation_store_error("Error getting conversation history", supabase_error)
-        elif conversation_id:
-            async with LOCAL_CONVERSATION_LOCK:
-                conversation_history = list(LOCAL_CONVERSATION_STORE.get(conversation_id, []))
+        conversation_history = await load_conversation_history(conversation_id)
 
-        async def event_stream() -> AsyncGenerator[str, None]:
+        async def event_stream() -> AsyncGenerator[bytes, None]:
             try:
-                accumulated_visible = ""
+                visible_parts: List[str] = []
                 final_response: Optional[str] = None
-                async for kind, payload in stream_ai_response(
-                    request.message,
-                    conversation_history,
-                    request.context,
-                    request.system_prompt,
-                    request.attachments,
+                async for kind, payload in coalesce_stream_deltas(
+                    stream_ai_response(
+                        request.message,
+                        conversation_history,
+                        request.context,
+                        request.system_prompt,
+                        request.attachments,
+                        conversation_id,
+                    )
                 ):
                     if kind == "delta":
-                        if not payload:
-                            continue
-                        accumulated_visible += payload
+                        visible_parts.append(payload)
                         yield _sse_event("token", {"delta": payload})
-                        if STREAMING_TOKEN_DELAY:
-                            await asyncio.sleep(STREAMING_TOKEN_DELAY)
-                        else:
-                            await asyncio.sleep(0)
                     elif kind == "final":
                         if payload:
                             final_response = payload
 
                 if final_response is None:
-                    final_response = accumulated_visible
+                    final_response = "".join(visible_parts)
 
                 await save_conversation_message(
                     conversation_id,
@@ -1295,7 +3091,7 @@ async def chat_with_ai_stream(request: ChatRequest, db: databases.Database = Dep
                     },
                 )
 
-                await update_user_streak(request.user_id, db)
+                STREAK_TOUCHER.touch(request.user_id, db)
 
                 yield _sse_event(
                     "end",
@@ -1314,7 +3110,7 @@ async def chat_with_ai_stream(request: ChatRequest, db: databases.Database = Dep
         }
         return StreamingResponse(event_stream(), media_type="text/event-stream", headers=headers)
     except Exception as error:
-        async def error_stream() -> AsyncGenerator[str, None]:
+        async def error_stream() -> AsyncGenerator[bytes, None]:
             yield _sse_event("error", {"message": str(error)})
 
         return StreamingResponse(error_stream(), status_code=500, media_type="text/event-stream")
@@ -1323,20 +3119,7 @@ async def chat_with_ai_stream(request: ChatRequest, db: databases.Database = Dep
 async def get_conversation(conversation_id: str):
     """Get conversation history"""
     try:
-        if not _conversation_store_available():
-            async with LOCAL_CONVERSATION_LOCK:
-                return list(LOCAL_CONVERSATION_STORE.get(conversation_id, []))
-
-        try:
-            result = supabase.table("conversations").select("history").eq("id", conversation_id).execute()
-            if result.data:
-                return result.data[0]["history"] or []
-            return []
-        except Exception as supabase_error:
-            # Handle missing table gracefully
-            _handle_conversation_store_error("Warning: Conversations table not found or inaccessible", supabase_error)
-            return []
-
+        return await load_conversation_history(conversation_id)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching conversation: {str(e)}")
 
@@ -1350,13 +3133,12 @@ async def create_conversation(request: ChatSessionCreate):
             return {"id": str(uuid.uuid4()), "title": request.title, "history": []}
 
         try:
-            result = supabase.table("conversations").insert({
+            result = supabase.table(CONVERSATIONS_TABLE).insert({
                 "title": request.title,
-                "history": []
             }).execute()
 
             if result.data:
-                return result.data[0]
+                return {**result.data[0], "history": []}
             else:
                 raise HTTPException(status_code=500, detail="Failed to create conversation")
         except Exception as supabase_error:
@@ -1369,57 +3151,53 @@ async def create_conversation(request: ChatSessionCreate):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error creating conversation: {str(e)}")
 
-# User endpoints
-@app.post("/users/", response_model=User, status_code=status.HTTP_201_CREATED)
-async def create_user(user: UserCreate, db: databases.Database = Depends(get_database)):
-    initials = generate_initials(user.full_name)
-    now = datetime.utcnow()
-    query = users.insert().values(
-        email=user.email,
-        full_name=user.full_name,
-        profile_picture_url=user.profile_picture_url,
-        role=user.role,
-        initials=initials,
-        created_at=now,
-        updated_at=now
-    )
-    user_id = await db.execute(query)
+# Default data seeded for every new user. Templates are parsed once at import so signup
+# only has to stamp in the user id and timestamps.
+DEFAULT_CALENDAR_SEEDS: Tuple[Dict[str, Any], ...] = (
+    {
+        "label": "Operations",
+        "color": "linear-gradient(135deg, #5b8def, #304ffe)",
+        "is_visible": True,
+    },
+    {
+        "label": "Team",
+        "color": "linear-gradient(135deg, #ff7d9d, #ff14c6)",
+        "is_visible": True,
+    },
+    {
+        "label": "Personal",
+        "color": "linear-gradient(135deg, #20d39c, #0c9f6f)",
+        "is_visible": True,
+    },
+)
 
-    # Seed default calendars
-    default_calendars = [
-        {
-            "label": "Operations",
-            "color": "linear-gradient(135deg, #5b8def, #304ffe)",
-            "is_visible": True,
-        },
-        {
-            "label": "Team",
-            "color": "linear-gradient(135deg, #ff7d9d, #ff14c6)",
-            "is_visible": True,
-        },
-        {
-            "label": "Personal",
-            "color": "linear-gradient(135deg, #20d39c, #0c9f6f)",
-            "is_visible": True,
-        },
-    ]
 
-    calendar_ids: Dict[str, int] = {}
-    for calendar in default_calendars:
-        calendar_id = await db.execute(
-            calendars.insert().values(
-                user_id=user_id,
-                label=calendar["label"],
-                color=calendar["color"],
-                is_visible=calendar["is_visible"],
-                created_at=now,
-                updated_at=now,
-            )
+def _compile_event_seeds(events: List[Dict[str, str]]) -> Tuple[Dict[str, Any], ...]:
+    calendar_labels = {calendar["label"] for calendar in DEFAULT_CALENDAR_SEEDS}
+    compiled: List[Dict[str, Any]] = []
+    for event in events:
+        if event["calendar_label"] not in calendar_labels:
+            continue
+        try:
+            start_time = datetime.fromisoformat(event["start"])
+            end_time = datetime.fromisoformat(event["end"])
+        except ValueError:
+            # Skip invalid event definitions rather than breaking user creation
+            continue
+        compiled.append(
+            {
+                "calendar_label": event["calendar_label"],
+                "title": event["title"],
+                "description": None,
+                "start_time": start_time,
+                "end_time": end_time,
+            }
         )
-        calendar_ids[calendar["label"]] = calendar_id
+    return tuple(compiled)
+
 
-    # Seed default calendar events
-    default_events = [
+DEFAULT_EVENT_SEEDS = _compile_event_seeds(
+    [
         {
             "title": "Builder cohort sync",
             "calendar_label": "Operations",
@@ -1457,29 +3235,65 @@ async def create_user(user: UserCreate, db: databases.Database = Depends(get_dat
             "end": "2025-10-23T08:15:00",
         },
     ]
+)
 
-    for event in default_events:
-        calendar_id = calendar_ids.get(event["calendar_label"])
-        if calendar_id is None:
-            continue
-        try:
-            start_time = datetime.fromisoformat(event["start"])
-            end_time = datetime.fromisoformat(event["end"])
-        except ValueError:
-            # Skip invalid event definitions rather than breaking user creation
-            continue
+SEED_CALENDARS_QUERY = calendars.insert()
+SEED_EVENTS_QUERY = calendar_events.insert()
 
-        await db.execute(
-            calendar_events.insert().values(
-                user_id=user_id,
-                calendar_id=calendar_id,
-                title=event["title"],
-                description=None,
-                start_time=start_time,
-                end_time=end_time,
-                created_at=now,
-            )
+
+async def seed_default_user_data(db: databases.Database, user_id: int, now: datetime) -> None:
+    """Insert the default calendars and events for a new user inside the caller's transaction."""
+    if not DEFAULT_CALENDAR_SEEDS:
+        return
+    await db.execute(
+        SEED_CALENDARS_QUERY.values(
+            [
+                {**calendar, "user_id": user_id, "created_at": now, "updated_at": now}
+                for calendar in DEFAULT_CALENDAR_SEEDS
+            ]
         )
+    )
+    if not DEFAULT_EVENT_SEEDS:
+        return
+
+    calendar_rows = await db.fetch_all(
+        sqlalchemy.select([calendars.c.id, calendars.c.label]).where(calendars.c.user_id == user_id)
+    )
+    calendar_ids = {row["label"]: row["id"] for row in calendar_rows}
+    event_rows = [
+        {
+            "user_id": user_id,
+            "calendar_id": calendar_ids[event["calendar_label"]],
+            "title": event["title"],
+            "description": event["description"],
+            "start_time": event["start_time"],
+            "end_time": event["end_time"],
+            "created_at": now,
+        }
+        for event in DEFAULT_EVENT_SEEDS
+        if event["calendar_label"] in calendar_ids
+    ]
+    if event_rows:
+        await db.execute(SEED_EVENTS_QUERY.values(event_rows))
+
+
+# User endpoints
+@app.post("/users/", response_model=User, status_code=status.HTTP_201_CREATED)
+async def create_user(user: UserCreate, db: databases.Database = Depends(get_database)):
+    initials = generate_initials(user.full_name)
+    now = datetime.utcnow()
+    query = users.insert().values(
+        email=user.email,
+        full_name=user.full_name,
+        profile_picture_url=user.profile_picture_url,
+        role=user.role,
+        initials=initials,
+        created_at=now,
+        updated_at=now
+    )
+    async with db.transaction():
+        user_id = await db.execute(query)
+        await seed_default_user_data(db, user_id, now)
 
     # Plans: no default placeholder data - users create their own
 
@@ -1511,30 +3325,47 @@ async def get_user_by_email(email: str, db: databases.Database = Depends(get_dat
 
 @app.put("/users/{user_id}", response_model=User)
 async def update_user(user_id: int, user_update: UserUpdate, db: databases.Database = Depends(get_database)):
-    # Get current user
-    query = users.select().where(users.c.id == user_id)
-    current_user = await db.fetch_one(query)
-    if not current_user:
-        raise HTTPException(status_code=404, detail="User not found")
-
-    # Update fields
     update_data = user_update.dict(exclude_unset=True)
     if "full_name" in update_data:
         update_data["initials"] = generate_initials(update_data["full_name"])
 
     update_data["updated_at"] = datetime.utcnow()
 
-    query = users.update().where(users.c.id == user_id).values(**update_data)
-    await db.execute(query)
+    updated_user = await update_returning(db, users, users.c.id == user_id, update_data)
+    if not updated_user:
+        raise HTTPException(status_code=404, detail="User not found")
+    return updated_user
+
+# Legacy rows may lack updated_at; report them with their creation time instead.
+CHAT_SESSION_COLUMNS = [
+    chat_sessions.c.id,
+    chat_sessions.c.user_id,
+    chat_sessions.c.title,
+    chat_sessions.c.created_at,
+    sqlalchemy.func.coalesce(chat_sessions.c.updated_at, chat_sessions.c.created_at).label("updated_at"),
+]
 
-    # Return updated user
-    query = users.select().where(users.c.id == user_id)
-    return await db.fetch_one(query)
 
 @app.get("/users/{user_id}/chat-sessions", response_model=List[ChatSession])
-async def get_user_chat_sessions(user_id: int, db: databases.Database = Depends(get_database)):
-    query = chat_sessions.select().where(chat_sessions.c.user_id == user_id).order_by(chat_sessions.c.updated_at.desc())
-    return await db.fetch_all(query)
+async def get_user_chat_sessions(
+    user_id: int,
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=PAGINATION_MAX_PAGE_SIZE),
+    db: databases.Database = Depends(get_database),
+):
+    """List chat sessions, most recently updated first, optionally paged by cursor."""
+    rows, next_cursor = await fetch_keyset_page(
+        db,
+        sqlalchemy.select(CHAT_SESSION_COLUMNS).where(chat_sessions.c.user_id == user_id),
+        chat_sessions.c.updated_at,
+        chat_sessions.c.id,
+        cursor,
+        limit,
+    )
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return rows
 
 @app.post("/users/{user_id}/chat-sessions", response_model=ChatSession, status_code=status.HTTP_201_CREATED)
 async def create_chat_session(user_id: int, session: ChatSessionCreate, db: databases.Database = Depends(get_database)):
@@ -1553,42 +3384,35 @@ async def get_user_calendars(user_id: int, db: databases.Database = Depends(get_
 @app.post("/users/{user_id}/calendars", response_model=Calendar, status_code=status.HTTP_201_CREATED)
 async def create_calendar(user_id: int, calendar: CalendarCreate, db: databases.Database = Depends(get_database)):
     now = datetime.utcnow()
-    calendar_id = await db.execute(
-        calendars.insert().values(
-            user_id=user_id,
-            label=calendar.label,
-            color=calendar.color,
-            is_visible=calendar.is_visible,
-            created_at=now,
-            updated_at=now,
-        )
+    return await insert_returning(
+        db,
+        calendars,
+        {
+            "user_id": user_id,
+            "label": calendar.label,
+            "color": calendar.color,
+            "is_visible": calendar.is_visible,
+            "created_at": now,
+            "updated_at": now,
+        },
     )
-    query = calendars.select().where(calendars.c.id == calendar_id)
-    return await db.fetch_one(query)
 
 @app.patch("/users/{user_id}/calendars/{calendar_id}", response_model=Calendar)
 async def update_calendar(user_id: int, calendar_id: int, calendar_update: CalendarUpdate, db: databases.Database = Depends(get_database)):
-    existing = await db.fetch_one(
-        calendars.select().where(
-            (calendars.c.id == calendar_id) & (calendars.c.user_id == user_id)
-        )
-    )
-    if not existing:
-        raise HTTPException(status_code=404, detail="Calendar not found")
-
+    owned = (calendars.c.id == calendar_id) & (calendars.c.user_id == user_id)
     update_data = calendar_update.dict(exclude_unset=True)
     if not update_data:
+        existing = await db.fetch_one(calendars.select().where(owned))
+        if not existing:
+            raise HTTPException(status_code=404, detail="Calendar not found")
         return existing
 
     update_data["updated_at"] = datetime.utcnow()
 
-    await db.execute(
-        calendars.update()
-        .where((calendars.c.id == calendar_id) & (calendars.c.user_id == user_id))
-        .values(**update_data)
-    )
-    query = calendars.select().where(calendars.c.id == calendar_id)
-    return await db.fetch_one(query)
+    updated = await update_returning(db, calendars, owned, update_data)
+    if not updated:
+        raise HTTPException(status_code=404, detail="Calendar not found")
+    return updated
 
 @app.get("/users/{user_id}/plans", response_model=List[Plan])
 async def get_user_plans(user_id: int, db: databases.Database = Depends(get_database)):
@@ -1598,41 +3422,34 @@ async def get_user_plans(user_id: int, db: databases.Database = Depends(get_data
 @app.post("/users/{user_id}/plans", response_model=Plan, status_code=status.HTTP_201_CREATED)
 async def create_plan(user_id: int, plan: PlanCreate, db: databases.Database = Depends(get_database)):
     now = datetime.utcnow()
-    plan_id = await db.execute(
-        plans.insert().values(
-            user_id=user_id,
-            label=plan.label,
-            completed=plan.completed,
-            created_at=now,
-            updated_at=now,
-        )
+    return await insert_returning(
+        db,
+        plans,
+        {
+            "user_id": user_id,
+            "label": plan.label,
+            "completed": plan.completed,
+            "created_at": now,
+            "updated_at": now,
+        },
     )
-    query = plans.select().where(plans.c.id == plan_id)
-    return await db.fetch_one(query)
 
 @app.patch("/users/{user_id}/plans/{plan_id}", response_model=Plan)
 async def update_plan(user_id: int, plan_id: int, plan_update: PlanUpdate, db: databases.Database = Depends(get_database)):
-    existing = await db.fetch_one(
-        plans.select().where(
-            (plans.c.id == plan_id) & (plans.c.user_id == user_id)
-        )
-    )
-    if not existing:
-        raise HTTPException(status_code=404, detail="Plan not found")
-
+    owned = (plans.c.id == plan_id) & (plans.c.user_id == user_id)
     update_data = plan_update.dict(exclude_unset=True)
     if not update_data:
+        existing = await db.fetch_one(plans.select().where(owned))
+        if not existing:
+            raise HTTPException(status_code=404, detail="Plan not found")
         return existing
 
     update_data["updated_at"] = datetime.utcnow()
 
-    await db.execute(
-        plans.update()
-        .where((plans.c.id == plan_id) & (plans.c.user_id == user_id))
-        .values(**update_data)
-    )
-    query = plans.select().where(plans.c.id == plan_id)
-    return await db.fetch_one(query)
+    updated = await update_returning(db, plans, owned, update_data)
+    if not updated:
+        raise HTTPException(status_code=404, detail="Plan not found")
+    return updated
 
 @app.delete("/users/{user_id}/plans/{plan_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_plan(user_id: int, plan_id: int, db: databases.Database = Depends(get_database)):
@@ -1652,6 +3469,27 @@ async def delete_plan(user_id: int, plan_id: int, db: databases.Database = Depen
     await db.execute(delete_query)
     return None
 
+@app.post("/users/{user_id}/plans/batch", response_model=PlanBatchResponse)
+async def batch_update_plans(user_id: int, batch: PlanBatchRequest, db: databases.Database = Depends(get_database)):
+    """Create, update and delete many plans in one transaction with per-item results."""
+    if len(batch.operations) > BATCH_MUTATION_MAX_OPERATIONS:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"A batch may contain at most {BATCH_MUTATION_MAX_OPERATIONS} operations.",
+        )
+    results = await apply_batch_operations(
+        db,
+        plans,
+        user_id,
+        batch.operations,
+        fields=("label", "completed"),
+        required_create_fields=("label",),
+        defaults={"completed": False},
+    )
+    for result in results:
+        result["plan"] = result.pop("row", None)
+    return {"results": results}
+
 @app.get("/users/{user_id}/habits", response_model=List[Habit])
 async def get_user_habits(user_id: int, db: databases.Database = Depends(get_database)):
     query = habits.select().where(habits.c.user_id == user_id).order_by(habits.c.created_at)
@@ -1660,42 +3498,35 @@ async def get_user_habits(user_id: int, db: databases.Database = Depends(get_dat
 @app.post("/users/{user_id}/habits", response_model=Habit, status_code=status.HTTP_201_CREATED)
 async def create_habit(user_id: int, habit: HabitCreate, db: databases.Database = Depends(get_database)):
     now = datetime.utcnow()
-    habit_id = await db.execute(
-        habits.insert().values(
-            user_id=user_id,
-            label=habit.label,
-            streak_label=habit.streak_label,
-            previous_label=habit.previous_label,
-            created_at=now,
-            updated_at=now,
-        )
+    return await insert_returning(
+        db,
+        habits,
+        {
+            "user_id": user_id,
+            "label": habit.label,
+            "streak_label": habit.streak_label,
+            "previous_label": habit.previous_label,
+            "created_at": now,
+            "updated_at": now,
+        },
     )
-    query = habits.select().where(habits.c.id == habit_id)
-    return await db.fetch_one(query)
 
 @app.patch("/users/{user_id}/habits/{habit_id}", response_model=Habit)
 async def update_habit(user_id: int, habit_id: int, habit_update: HabitUpdate, db: databases.Database = Depends(get_database)):
-    existing = await db.fetch_one(
-        habits.select().where(
-            (habits.c.id == habit_id) & (habits.c.user_id == user_id)
-        )
-    )
-    if not existing:
-        raise HTTPException(status_code=404, detail="Habit not found")
-
+    owned = (habits.c.id == habit_id) & (habits.c.user_id == user_id)
     update_data = habit_update.dict(exclude_unset=True)
     if not update_data:
+        existing = await db.fetch_one(habits.select().where(owned))
+        if not existing:
+            raise HTTPException(status_code=404, detail="Habit not found")
         return existing
 
     update_data["updated_at"] = datetime.utcnow()
 
-    await db.execute(
-        habits.update()
-        .where((habits.c.id == habit_id) & (habits.c.user_id == user_id))
-        .values(**update_data)
-    )
-    query = habits.select().where(habits.c.id == habit_id)
-    return await db.fetch_one(query)
+    updated = await update_returning(db, habits, owned, update_data)
+    if not updated:
+        raise HTTPException(status_code=404, detail="Habit not found")
+    return updated
 
 @app.delete("/users/{user_id}/habits/{habit_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_habit(user_id: int, habit_id: int, db: databases.Database = Depends(get_database)):
@@ -1715,6 +3546,27 @@ async def delete_habit(user_id: int, habit_id: int, db: databases.Database = Dep
     await db.execute(delete_query)
     return None
 
+@app.post("/users/{user_id}/habits/batch", response_model=HabitBatchResponse)
+async def batch_update_habits(user_id: int, batch: HabitBatchRequest, db: databases.Database = Depends(get_database)):
+    """Create, update and delete many habits in one transaction with per-item results."""
+    if len(batch.operations) > BATCH_MUTATION_MAX_OPERATIONS:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"A batch may contain at most {BATCH_MUTATION_MAX_OPERATIONS} operations.",
+        )
+    results = await apply_batch_operations(
+        db,
+        habits,
+        user_id,
+        batch.operations,
+        fields=("label", "streak_label", "previous_label"),
+        required_create_fields=("label", "streak_label", "previous_label"),
+        defaults={},
+    )
+    for result in results:
+        result["habit"] = result.pop("row", None)
+    return {"results": results}
+
 @app.get("/users/{user_id}/streak", response_model=UserStreak)
 async def get_user_streak(user_id: int, db: databases.Database = Depends(get_database)):
     streak = await get_or_create_user_streak(user_id, db)
@@ -1724,11 +3576,60 @@ async def get_user_streak(user_id: int, db: databases.Database = Depends(get_dat
 async def touch_user_streak(user_id: int, db: databases.Database = Depends(get_database)):
     return await update_user_streak(user_id, db)
 
+def _naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """Normalize an aware datetime to the naive UTC values stored in the database."""
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def calendar_events_in_range_query(
+    user_id: int, start: Optional[datetime], end: Optional[datetime]
+) -> Any:
+    """Select a user's events that overlap ``[start, end)``, ordered by start time."""
+    owned = calendar_events.c.user_id == user_id
+    if start is None and end is None:
+        return calendar_events.select().where(owned).order_by(calendar_events.c.start_time)
+    if start is None:
+        return (
+            calendar_events.select()
+            .where(owned & (calendar_events.c.start_time < end))
+            .order_by(calendar_events.c.start_time)
+        )
+    if end is None:
+        return (
+            calendar_events.select()
+            .where(owned & (calendar_events.c.end_time > start))
+            .order_by(calendar_events.c.start_time)
+        )
+    starting_inside = calendar_events.select().where(
+        owned & (calendar_events.c.start_time >= start) & (calendar_events.c.start_time < end)
+    )
+    # COALESCE keeps the planner on the end_time index for this half; a bare
+    # start_time < start tempts it into scanning every earlier event instead.
+    spanning_start = calendar_events.select().where(
+        owned
+        & (calendar_events.c.end_time > start)
+        & (sqlalchemy.func.coalesce(calendar_events.c.start_time, calendar_events.c.end_time) < start)
+    )
+    return sqlalchemy.union_all(starting_inside, spanning_start).order_by(
+        sqlalchemy.literal_column("start_time")
+    )
+
+
 @app.get("/users/{user_id}/calendar-events", response_model=List[CalendarEvent])
-async def get_user_calendar_events(user_id: int, db: databases.Database = Depends(get_database)):
-    # Fixed query to avoid calendar_id column references
-    query = calendar_events.select().where(calendar_events.c.user_id == user_id).order_by(calendar_events.c.start_time)
-    return await db.fetch_all(query)
+async def get_user_calendar_events(
+    user_id: int,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    db: databases.Database = Depends(get_database),
+):
+    """List a user's events, optionally only those overlapping the ``start``/``end`` window."""
+    start = _naive_utc(start)
+    end = _naive_utc(end)
+    if start is not None and end is not None and end <= start:
+        raise HTTPException(status_code=400, detail="end must be after start")
+    return await db.fetch_all(calendar_events_in_range_query(user_id, start, end))
 
 @app.post("/users/{user_id}/calendar-events", response_model=CalendarEvent, status_code=status.HTTP_201_CREATED)
 async def create_calendar_event(user_id: int, event: CalendarEventCreate, db: databases.Database = Depends(get_database)):
@@ -1743,46 +3644,181 @@ async def create_calendar_event(user_id: int, event: CalendarEventCreate, db: da
     return {**event.dict(), "id": event_id, "user_id": user_id}
 
 # Proactivity API endpoints
-@app.get("/users/{user_id}/proactivity", response_model=List[ProactivityLog])
-async def get_user_proactivity(user_id: int, db: databases.Database = Depends(get_database)):
-    """Get user's proactivity logs"""
-    from datetime import datetime
+# Older rows may have null timestamps; fill them in SQL so rows can be returned as-is.
+PROACTIVITY_LOG_COLUMNS = [
+    proactivity_logs.c.id,
+    proactivity_logs.c.user_id,
+    sqlalchemy.func.coalesce(
+        proactivity_logs.c.activity_date, proactivity_logs.c.created_at, proactivity_logs.c.updated_at
+    ).label("activity_date"),
+    proactivity_logs.c.tasks_completed,
+    proactivity_logs.c.total_tasks,
+    proactivity_logs.c.score,
+    proactivity_logs.c.notes,
+    sqlalchemy.func.coalesce(
+        proactivity_logs.c.created_at, proactivity_logs.c.activity_date, proactivity_logs.c.updated_at
+    ).label("created_at"),
+    sqlalchemy.func.coalesce(
+        proactivity_logs.c.updated_at, proactivity_logs.c.created_at, proactivity_logs.c.activity_date
+    ).label("updated_at"),
+]
+
+
+async def fetch_proactivity_page(
+    db: databases.Database,
+    user_id: int,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+) -> Tuple[List[Any], Optional[str]]:
+    return await fetch_keyset_page(
+        db,
+        sqlalchemy.select(PROACTIVITY_LOG_COLUMNS).where(proactivity_logs.c.user_id == user_id),
+        proactivity_logs.c.activity_date,
+        proactivity_logs.c.id,
+        cursor,
+        limit,
+    )
 
-    query = proactivity_logs.select().where(proactivity_logs.c.user_id == user_id).order_by(proactivity_logs.c.activity_date.desc())
-    results = await db.fetch_all(query)
 
-    # Fix null timestamps for response
-    formatted_results = []
-    for result in results:
-        formatted_results.append({
-            "id": result.id,
-            "user_id": result.user_id,
-            "activity_date": result.activity_date,
-            "tasks_completed": result.tasks_completed,
-            "total_tasks": result.total_tasks,
-            "score": result.score,
-            "notes": result.notes,
-            "created_at": result.created_at if result.created_at else datetime.utcnow(),
-            "updated_at": result.updated_at if result.updated_at else datetime.utcnow()
-        })
+# A day counts towards the proactivity streak once any of its logs reaches this score.
+PROACTIVITY_STREAK_MIN_SCORE = 70
+
+
+def _proactivity_score(tasks_completed: int, total_tasks: int) -> int:
+    if total_tasks <= 0:
+        return 0
+    return int(min(100, (tasks_completed / total_tasks) * 100))
+
+
+def _day_bounds(day: date) -> Tuple[datetime, datetime]:
+    start = datetime.combine(day, datetime.min.time())
+    return start, start + timedelta(days=1)
+
+
+def _streak_runs(days: List[date]) -> Tuple[int, int]:
+    """Return (length of the run ending at the last day, longest run) for sorted unique days."""
+    current = best = 0
+    previous: Optional[date] = None
+    for day in days:
+        current = current + 1 if previous is not None and day == previous + timedelta(days=1) else 1
+        best = max(best, current)
+        previous = day
+    return current, best
+
+
+async def compute_proactivity_streak(db: databases.Database, user_id: int) -> Dict[str, Any]:
+    """Compute a user's streak summary from their qualifying logs without storing it."""
+    rows = await db.fetch_all(
+        sqlalchemy.select([proactivity_logs.c.activity_date])
+        .where(
+            (proactivity_logs.c.user_id == user_id)
+            & (proactivity_logs.c.score >= PROACTIVITY_STREAK_MIN_SCORE)
+        )
+        .order_by(proactivity_logs.c.activity_date)
+    )
+    days = sorted({row["activity_date"].date() for row in rows if row["activity_date"]})
+    current, best = _streak_runs(days)
+    return {
+        "current_streak": current,
+        "best_streak": best,
+        "last_qualifying_day": days[-1] if days else None,
+    }
+
+
+async def rebuild_proactivity_streak(db: databases.Database, user_id: int) -> Any:
+    """Recompute a user's streak summary from their qualifying logs and store it."""
+    now = datetime.utcnow()
+    values = {**await compute_proactivity_streak(db, user_id), "updated_at": now}
+    return await upsert_returning(
+        db,
+        proactivity_streaks,
+        {**values, "user_id": user_id, "created_at": now},
+        ("user_id",),
+        values,
+    )
+
+
+async def record_proactivity_day(db: databases.Database, user_id: int, day: date) -> None:
+    """Fold a write to one of ``day``'s logs into the user's streak summary."""
+    day_start, day_end = _day_bounds(day)
+    qualifies = await db.fetch_val(
+        sqlalchemy.select([sqlalchemy.func.count()])
+        .select_from(proactivity_logs)
+        .where(
+            (proactivity_logs.c.user_id == user_id)
+            & (proactivity_logs.c.activity_date >= day_start)
+            & (proactivity_logs.c.activity_date < day_end)
+            & (proactivity_logs.c.score >= PROACTIVITY_STREAK_MIN_SCORE)
+        )
+    )
+    summary = await db.fetch_one(
+        proactivity_streaks.select()
+        .where(proactivity_streaks.c.user_id == user_id)
+        .with_for_update()
+    )
+    if summary is None:
+        await rebuild_proactivity_streak(db, user_id)
+        return
 
-    return formatted_results
+    last_day = summary["last_qualifying_day"]
+    if not qualifies:
+        if last_day == day:
+            await rebuild_proactivity_streak(db, user_id)
+        return
+    if last_day == day:
+        return
+    if last_day is not None and day < last_day:
+        await rebuild_proactivity_streak(db, user_id)
+        return
+
+    current = summary["current_streak"] + 1 if last_day == day - timedelta(days=1) else 1
+    await db.execute(
+        proactivity_streaks.update()
+        .where(proactivity_streaks.c.user_id == user_id)
+        .values(
+            current_streak=current,
+            best_streak=max(summary["best_streak"] or 0, current),
+            last_qualifying_day=day,
+            updated_at=datetime.utcnow(),
+        )
+    )
+
+
+@app.get("/users/{user_id}/proactivity", response_model=List[ProactivityLog])
+async def get_user_proactivity(
+    user_id: int,
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=PAGINATION_MAX_PAGE_SIZE),
+    db: databases.Database = Depends(get_database),
+):
+    """Get user's proactivity logs, newest first, optionally paged by cursor."""
+    rows, next_cursor = await fetch_proactivity_page(db, user_id, cursor, limit)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return rows
 
 @app.post("/users/{user_id}/proactivity", response_model=ProactivityLog, status_code=status.HTTP_201_CREATED)
 async def create_proactivity_log(user_id: int, proactivity: ProactivityLogCreate, db: databases.Database = Depends(get_database)):
     """Create a new proactivity log entry"""
-    # Calculate score based on tasks completed vs total tasks
-    score = min(100, (proactivity.tasks_completed / max(proactivity.total_tasks, 1)) * 100) if proactivity.total_tasks > 0 else 0
-    query = proactivity_logs.insert().values(
-        user_id=user_id,
-        activity_date=datetime.utcnow(),
-        tasks_completed=proactivity.tasks_completed,
-        total_tasks=proactivity.total_tasks,
-        score=score,
-        notes=proactivity.notes
-    )
-    log_id = await db.execute(query)
-    return {**proactivity.dict(), "id": log_id, "user_id": user_id}
+    now = datetime.utcnow()
+    async with db.transaction():
+        log = await insert_returning(
+            db,
+            proactivity_logs,
+            {
+                "user_id": user_id,
+                "activity_date": now,
+                "tasks_completed": proactivity.tasks_completed,
+                "total_tasks": proactivity.total_tasks,
+                "score": _proactivity_score(proactivity.tasks_completed, proactivity.total_tasks),
+                "notes": proactivity.notes,
+                "created_at": now,
+                "updated_at": now,
+            },
+        )
+        await record_proactivity_day(db, user_id, now.date())
+    return log
 
 @app.post("/users/{user_id}/proactivity/daily-checkin", response_model=ProactivityLog)
 async def daily_proactivity_checkin(
@@ -1791,97 +3827,111 @@ async def daily_proactivity_checkin(
     db: databases.Database = Depends(get_database)
 ):
     """Daily proactivity check-in - creates or updates today's proactivity log"""
-    from datetime import datetime
-    from sqlalchemy import func
-
-    today = datetime.utcnow().date()
-
-    # Check if there's already a log for today
-    existing_log_query = proactivity_logs.select().where(
-        (proactivity_logs.c.user_id == user_id) &
-        (func.date(proactivity_logs.c.activity_date) == today)
-    )
-    existing_log = await db.fetch_one(existing_log_query)
+    now = datetime.utcnow()
+    today = now.date()
+    score = _proactivity_score(checkin.tasks_completed, checkin.total_tasks)
+    checkin_values = {
+        "tasks_completed": checkin.tasks_completed,
+        "total_tasks": checkin.total_tasks,
+        "score": score,
+        "notes": checkin.notes,
+        "updated_at": now,
+    }
 
-    if existing_log:
-        # Update existing log with new data
-        score = min(100, (checkin.tasks_completed / max(checkin.total_tasks, 1)) * 100) if checkin.total_tasks > 0 else 0
-        await db.execute(
-            proactivity_logs.update()
-            .where(proactivity_logs.c.id == existing_log.id)
-            .values(
-                tasks_completed=checkin.tasks_completed,
-                total_tasks=checkin.total_tasks,
-                score=score,
-                notes=checkin.notes
-            )
-        )
-        result = await db.fetch_one(proactivity_logs.select().where(proactivity_logs.c.id == existing_log.id))
-        return {
-            "id": result.id,
-            "user_id": result.user_id,
-            "activity_date": result.activity_date,
-            "tasks_completed": result.tasks_completed,
-            "total_tasks": result.total_tasks,
-            "score": result.score,
-            "notes": result.notes,
-            "created_at": result.created_at if result.created_at else datetime.utcnow(),
-            "updated_at": datetime.utcnow()
-        }
-    else:
-        # Create new log for today
-        score = min(100, (checkin.tasks_completed / max(checkin.total_tasks, 1)) * 100) if checkin.total_tasks > 0 else 0
-        query = proactivity_logs.insert().values(
-            user_id=user_id,
-            activity_date=datetime.utcnow(),
-            tasks_completed=checkin.tasks_completed,
-            total_tasks=checkin.total_tasks,
-            score=score,
-            notes=checkin.notes
+    async with db.transaction():
+        result = await upsert_returning(
+            db,
+            proactivity_logs,
+            {
+                **checkin_values,
+                "user_id": user_id,
+                "activity_date": now,
+                "activity_day": today,
+                "created_at": now,
+            },
+            conflict_columns=("user_id", "activity_day"),
+            update_values=checkin_values,
         )
-        log_id = await db.execute(query)
-        result = await db.fetch_one(proactivity_logs.select().where(proactivity_logs.c.id == log_id))
-        return {
-            "id": result.id,
-            "user_id": result.user_id,
-            "activity_date": result.activity_date,
-            "tasks_completed": result.tasks_completed,
-            "total_tasks": result.total_tasks,
-            "score": result.score,
-            "notes": result.notes,
-            "created_at": datetime.utcnow(),
-            "updated_at": datetime.utcnow()
-        }
+        await record_proactivity_day(db, user_id, today)
+
+    return {**dict(result), "created_at": result["created_at"] or now}
 
 @app.get("/users/{user_id}/proactivity/streak", response_model=dict)
 async def get_proactivity_streak(user_id: int, db: databases.Database = Depends(get_database)):
-    """Get user's current proactivity streak"""
-    from datetime import datetime
-
-    # Calculate streak (consecutive days with proactivity score >= 70)
-    subquery = """
-        SELECT activity_date, score
-        FROM proactivity_logs
-        WHERE user_id = :user_id
-        AND score >= 70
-        ORDER BY activity_date DESC
-    """
-
-    # Execute raw query to get qualifying days
-    result = await db.fetch_all(subquery.replace(":user_id", str(user_id)))
-
-    streak = 0
-    current_date = None
-
-    for row in result:
-        # Parse the activity_date (it comes as a string from raw SQL)
-        row_date = datetime.strptime(row.activity_date.split('.')[0], '%Y-%m-%dT%H:%M:%S').date() if isinstance(row.activity_date, str) else row.activity_date.date()
-
-        if current_date is None or (row_date - current_date).days > 1:
-            streak = 1
-        current_date = row_date
+    """Get user's current and best proactivity streaks from their stored summary."""
+    summary = await db.fetch_one(
+        proactivity_streaks.select().where(proactivity_streaks.c.user_id == user_id)
+    )
+    if summary is None:
+        # Only users start.py has not backfilled yet; their next write stores a summary.
+        summary = await compute_proactivity_streak(db, user_id)
+
+    current = summary["current_streak"] or 0
+    last_day = summary["last_qualifying_day"]
+    if last_day is None or last_day < datetime.utcnow().date() - timedelta(days=1):
+        current = 0
+    return {"current_streak": current, "best_streak": summary["best_streak"] or 0}
+
+async def _dashboard_proactivity(user_id: int, db: databases.Database) -> List[Any]:
+    rows, _ = await fetch_proactivity_page(db, user_id)
+    return rows
+
+
+# Each dashboard section maps to the loader behind its standalone endpoint.
+DASHBOARD_SECTIONS: Dict[str, Callable[..., Any]] = {
+    "user": get_user,
+    "calendars": get_user_calendars,
+    "calendar_events": get_user_calendar_events,
+    "plans": get_user_plans,
+    "habits": get_user_habits,
+    "streak": get_user_streak,
+    "proactivity": _dashboard_proactivity,
+}
+# Sections that accept the dashboard's start/end window.
+DASHBOARD_WINDOWED_SECTIONS = {"calendar_events"}
+
+
+@app.get(
+    "/users/{user_id}/dashboard",
+    response_model=DashboardSnapshot,
+    response_model_exclude_unset=True,
+)
+async def get_dashboard_snapshot(
+    user_id: int,
+    sections: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    db: databases.Database = Depends(get_database),
+):
+    """Load several dashboard sections concurrently and return them in one payload."""
+    if sections:
+        requested = [name.strip() for name in sections.split(",") if name.strip()]
+        unknown = sorted(set(requested) - DASHBOARD_SECTIONS.keys())
+        if unknown:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Unknown dashboard sections: {', '.join(unknown)}",
+            )
+        requested = list(dict.fromkeys(requested))
+    else:
+        requested = list(DASHBOARD_SECTIONS)
+
+    # Let every section finish before surfacing a failure so no query is left running
+    # on a connection after the response has been sent.
+    results = await asyncio.gather(
+        *(
+            DASHBOARD_SECTIONS[name](user_id, db=db, start=start, end=end)
+            if name in DASHBOARD_WINDOWED_SECTIONS
+            else DASHBOARD_SECTIONS[name](user_id, db=db)
+            for name in requested
+        ),
+        return_exceptions=True,
+    )
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
+    return dict(zip(requested, results))
 
-    return {"current_streak": streak, "best_streak": streak}
 
 # Google Calendar helpers
 
@@ -1955,6 +4005,78 @@ async def upsert_google_calendar_credentials(db: databases.Database, creds: Goog
         )
     else:
         await db.execute(google_calendar_credentials.insert().values(payload))
+    GOOGLE_CALENDAR_SERVICES.invalidate(creds.user_id)
+
+
+class GoogleTokenManager:
+    """Refresh Google access tokens shortly before they expire and persist the result."""
+
+    def __init__(self, refresh_margin: float) -> None:
+        self.refresh_margin = refresh_margin
+        self._inflight: Dict[int, asyncio.Task] = {}
+        self.refreshes = 0
+        self.joined = 0
+        self.failures = 0
+
+    def needs_refresh(self, creds: GoogleCalendarCredentials) -> bool:
+        if not creds.refresh_token:
+            return False
+        expires_at = _naive_utc(creds.expires_at)
+        if expires_at is None:
+            return True
+        return expires_at - datetime.utcnow() <= timedelta(seconds=self.refresh_margin)
+
+    async def ensure_fresh(self, db: databases.Database, creds: GoogleCalendarCredentials) -> GoogleCalendarCredentials:
+        if not self.needs_refresh(creds):
+            return creds
+
+        user_id = creds.user_id
+        task = self._inflight.get(user_id)
+        if task is None:
+            task = asyncio.create_task(self._refresh(db, creds))
+            self._inflight[user_id] = task
+            task.add_done_callback(lambda done, uid=user_id: self._forget(uid, done))
+        else:
+            self.joined += 1
+        return await asyncio.shield(task)
+
+    def _forget(self, user_id: int, task: asyncio.Task) -> None:
+        if self._inflight.get(user_id) is task:
+            del self._inflight[user_id]
+
+    async def _refresh(self, db: databases.Database, creds: GoogleCalendarCredentials) -> GoogleCalendarCredentials:
+        try:
+            refreshed = await asyncio.to_thread(refresh_google_credentials, creds)
+        except Exception as e:
+            self.failures += 1
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail=f"Google Calendar authorization expired. Please reconnect: {str(e)}"
+            )
+        await upsert_google_calendar_credentials(db, refreshed)
+        self.refreshes += 1
+        return refreshed
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "refresh_margin_seconds": self.refresh_margin,
+            "in_flight": len(self._inflight),
+            "refreshes": self.refreshes,
+            "joined": self.joined,
+            "failures": self.failures,
+        }
+
+
+GOOGLE_TOKENS = GoogleTokenManager(GOOGLE_TOKEN_REFRESH_MARGIN)
+
+
+async def load_google_calendar_service(user_id: int, db: databases.Database) -> Any:
+    """Build (or reuse) a Calendar client for the user's stored, freshly refreshed tokens."""
+    query = google_calendar_credentials.select().where(google_calendar_credentials.c.user_id == user_id)
+    stored_creds = await db.fetch_one(query)
+
+    creds = await GOOGLE_TOKENS.ensure_fresh(db, map_google_credentials(stored_creds))
+    return await get_google_calendar_service(creds)
 
 
 # Google Calendar endpoints
@@ -1979,12 +4101,7 @@ async def google_calendar_callback(request: GoogleAuthCallbackRequest, db: datab
 async def get_google_calendars(user_id: int, db: databases.Database = Depends(get_database)):
     """Get user's Google Calendars."""
     try:
-        # Get user's Google Calendar credentials from database
-        query = google_calendar_credentials.select().where(google_calendar_credentials.c.user_id == user_id)
-        stored_creds = await db.fetch_one(query)
-
-        creds = map_google_credentials(stored_creds)
-        service = await get_google_calendar_service(creds)
+        service = await load_google_calendar_service(user_id, db)
         calendars = await list_google_calendars(service)
         return calendars
     except HTTPException as e:
@@ -1994,12 +4111,7 @@ async def get_google_calendars(user_id: int, db: databases.Database = Depends(ge
 async def get_google_calendar_events(user_id: int, calendar_id: str, time_min: Optional[datetime] = None, time_max: Optional[datetime] = None, db: databases.Database = Depends(get_database)):
     """Get events from a Google Calendar."""
     try:
-        # Get user's Google Calendar credentials from database
-        query = google_calendar_credentials.select().where(google_calendar_credentials.c.user_id == user_id)
-        stored_creds = await db.fetch_one(query)
-
-        creds = map_google_credentials(stored_creds)
-        service = await get_google_calendar_service(creds)
+        service = await load_google_calendar_service(user_id, db)
         events = await list_google_events(service, calendar_id, time_min, time_max)
         return events
     except HTTPException as e:
@@ -2009,12 +4121,7 @@ async def get_google_calendar_events(user_id: int, calendar_id: str, time_min: O
 async def create_google_calendar_event(user_id: int, calendar_id: str, event_data: dict, db: databases.Database = Depends(get_database)):
     """Create a new event in Google Calendar."""
     try:
-        # Get user's Google Calendar credentials from database
-        query = google_calendar_credentials.select().where(google_calendar_credentials.c.user_id == user_id)
-        stored_creds = await db.fetch_one(query)
-
-        creds = map_google_credentials(stored_creds)
-        service = await get_google_calendar_service(creds)
+        service = await load_google_calendar_service(user_id, db)
         event = await create_google_event(service, calendar_id, event_data)
         return event
     except HTTPException as e:
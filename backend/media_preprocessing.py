@@ -0,0 +1,72 @@
+"""Attachment preprocessing helpers that run in worker processes before Gemini uploads."""
+
+import io
+from typing import Optional, Tuple
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # pragma: no cover - Pillow is optional
+    Image = None
+    ImageOps = None
+
+RESIZABLE_IMAGE_TYPES = {"image/jpeg", "image/png", "image/webp"}
+INLINE_TEXT_TYPES = {"text/plain", "text/markdown", "text/x-markdown"}
+INLINE_TEXT_EXTENSIONS = (".txt", ".md", ".markdown")
+
+
+def image_preprocessing_available() -> bool:
+    return Image is not None
+
+
+def is_resizable_image(mime_type: Optional[str]) -> bool:
+    return Image is not None and (mime_type or "").lower() in RESIZABLE_IMAGE_TYPES
+
+
+def is_inline_text(mime_type: Optional[str], filename: Optional[str]) -> bool:
+    if (mime_type or "").lower() in INLINE_TEXT_TYPES:
+        return True
+    return (filename or "").lower().endswith(INLINE_TEXT_EXTENSIONS)
+
+
+def downscale_image(
+    data: bytes,
+    mime_type: str,
+    max_dimension: int,
+    jpeg_quality: int,
+) -> Optional[Tuple[bytes, str]]:
+    """Shrink an image to fit ``max_dimension``, returning the new bytes and MIME type or None."""
+    if Image is None:
+        return None
+
+    with Image.open(io.BytesIO(data)) as image:
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+
+        output = io.BytesIO()
+        has_alpha = image.mode in ("RGBA", "LA") or (
+            image.mode == "P" and "transparency" in image.info
+        )
+        if has_alpha:
+            image.save(output, format="PNG", optimize=True)
+            new_mime_type = "image/png"
+        else:
+            if image.mode != "RGB":
+                image = image.convert("RGB")
+            image.save(output, format="JPEG", quality=jpeg_quality, optimize=True)
+            new_mime_type = "image/jpeg"
+
+    encoded = output.getvalue()
+    if len(encoded) >= len(data):
+        return None
+    return encoded, new_mime_type
+
+
+def extract_inline_text(data: bytes, max_chars: int) -> Optional[str]:
+    """Decode a plain-text or markdown attachment, or return None if it is not usable inline."""
+    try:
+        text = data.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        return None
+    if "\x00" in text or len(text) > max_chars:
+        return None
+    return text.replace("\r\n", "\n")
@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 
 import uvicorn
+import datetime
 import os
 import sys
 import databases
@@ -42,6 +43,7 @@ if __name__ == "__main__":
         sqlalchemy.Column("title", sqlalchemy.String),
         sqlalchemy.Column("created_at", sqlalchemy.DateTime, default=sqlalchemy.func.now()),
         sqlalchemy.Column("updated_at", sqlalchemy.DateTime, default=sqlalchemy.func.now(), onupdate=sqlalchemy.func.now()),
+        sqlalchemy.Index("ix_chat_sessions_user_updated", "user_id", "updated_at", "id"),
     )
     calendars = sqlalchemy.Table(
         "calendars",
@@ -66,6 +68,8 @@ if __name__ == "__main__":
         sqlalchemy.Column("start_time", sqlalchemy.DateTime),
         sqlalchemy.Column("end_time", sqlalchemy.DateTime),
         sqlalchemy.Column("created_at", sqlalchemy.DateTime, default=sqlalchemy.func.now()),
+        sqlalchemy.Index("ix_calendar_events_user_start", "user_id", "start_time"),
+        sqlalchemy.Index("ix_calendar_events_user_end", "user_id", "end_time"),
     )
     plans = sqlalchemy.Table(
         "plans",
@@ -113,6 +117,21 @@ if __name__ == "__main__":
         sqlalchemy.Column("notes", sqlalchemy.String, nullable=True),
         sqlalchemy.Column("created_at", sqlalchemy.DateTime, default=sqlalchemy.func.now()),
         sqlalchemy.Column("updated_at", sqlalchemy.DateTime, default=sqlalchemy.func.now(), onupdate=sqlalchemy.func.now()),
+        sqlalchemy.Column("activity_day", sqlalchemy.Date, nullable=True),  # UTC day of a daily check-in
+        sqlalchemy.Index("ix_proactivity_logs_user_activity", "user_id", "activity_date", "id"),
+        sqlalchemy.Index("ux_proactivity_logs_user_day", "user_id", "activity_day", unique=True),
+    )
+    # Per-user proactivity streak summary, maintained as logs are written
+    proactivity_streaks = sqlalchemy.Table(
+        "proactivity_streaks",
+        metadata,
+        sqlalchemy.Column("id", sqlalchemy.Integer, primary_key=True, index=True),
+        sqlalchemy.Column("user_id", sqlalchemy.ForeignKey("users.id"), unique=True),
+        sqlalchemy.Column("current_streak", sqlalchemy.Integer, default=0),
+        sqlalchemy.Column("best_streak", sqlalchemy.Integer, default=0),
+        sqlalchemy.Column("last_qualifying_day", sqlalchemy.Date, nullable=True),
+        sqlalchemy.Column("created_at", sqlalchemy.DateTime, default=sqlalchemy.func.now()),
+        sqlalchemy.Column("updated_at", sqlalchemy.DateTime, default=sqlalchemy.func.now(), onupdate=sqlalchemy.func.now()),
     )
     # Fixed: Removed calendar_id reference from CalendarEvent table
 
@@ -133,7 +152,70 @@ if __name__ == "__main__":
         sqlalchemy.Column("updated_at", sqlalchemy.DateTime, default=sqlalchemy.func.now(), onupdate=sqlalchemy.func.now()),
     )
 
+    # Content hash -> Gemini file index used to skip re-uploading identical bytes
+    gemini_file_uploads = sqlalchemy.Table(
+        "gemini_file_uploads",
+        metadata,
+        sqlalchemy.Column("id", sqlalchemy.Integer, primary_key=True, index=True),
+        sqlalchemy.Column("content_sha256", sqlalchemy.String, nullable=False),
+        sqlalchemy.Column("mime_type", sqlalchemy.String, nullable=False, default=""),
+        sqlalchemy.Column("size_bytes", sqlalchemy.Integer),
+        sqlalchemy.Column("gemini_name", sqlalchemy.String),
+        sqlalchemy.Column("payload", sqlalchemy.String),  # JSON-serialized GeminiFile
+        sqlalchemy.Column("expires_at", sqlalchemy.DateTime),
+        sqlalchemy.Column("created_at", sqlalchemy.DateTime, default=sqlalchemy.func.now()),
+        sqlalchemy.Column("updated_at", sqlalchemy.DateTime, default=sqlalchemy.func.now(), onupdate=sqlalchemy.func.now()),
+        sqlalchemy.UniqueConstraint("content_sha256", "mime_type", name="uq_gemini_file_uploads_content"),
+    )
+
     metadata.create_all(engine)
+    # create_all does not alter existing tables, so add later columns by hand. Existing
+    # logs are backfilled with one check-in per user and day (the latest log that day).
+    proactivity_columns = {column["name"] for column in sqlalchemy.inspect(engine).get_columns("proactivity_logs")}
+    if "activity_day" not in proactivity_columns:
+        with engine.begin() as connection:
+            connection.execute(sqlalchemy.text("ALTER TABLE proactivity_logs ADD COLUMN activity_day DATE"))
+            connection.execute(sqlalchemy.text(
+                "UPDATE proactivity_logs SET activity_day = DATE(activity_date) "
+                "WHERE id IN (SELECT MAX(id) FROM proactivity_logs GROUP BY user_id, DATE(activity_date))"
+            ))
+    # Backfill streak summaries for users whose logs predate the summary table, so reading a
+    # streak stays a single lookup. Users that already have a summary are skipped.
+    with engine.begin() as connection:
+        pending_users = [row[0] for row in connection.execute(sqlalchemy.text(
+            "SELECT DISTINCT user_id FROM proactivity_logs "
+            "WHERE user_id IS NOT NULL AND user_id NOT IN (SELECT user_id FROM proactivity_streaks)"
+        ))]
+        for user_id in pending_users:
+            # 70 is PROACTIVITY_STREAK_MIN_SCORE in main.py.
+            days = [
+                datetime.date.fromisoformat(str(row[0])[:10])
+                for row in connection.execute(
+                    sqlalchemy.text(
+                        "SELECT DISTINCT DATE(activity_date) FROM proactivity_logs "
+                        "WHERE user_id = :user_id AND score >= 70 AND activity_date IS NOT NULL "
+                        "ORDER BY 1"
+                    ),
+                    {"user_id": user_id},
+                )
+            ]
+            current = best = 0
+            for index, day in enumerate(days):
+                current = current + 1 if index and day == days[index - 1] + datetime.timedelta(days=1) else 1
+                best = max(best, current)
+            now = datetime.datetime.utcnow()
+            connection.execute(proactivity_streaks.insert().values(
+                user_id=user_id,
+                current_streak=current,
+                best_streak=best,
+                last_qualifying_day=days[-1] if days else None,
+                created_at=now,
+                updated_at=now,
+            ))
+    # create_all skips indexes on tables that already exist, so add them explicitly.
+    for table in metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(engine, checkfirst=True)
     print("Database tables created successfully!")
 
     # Start the FastAPI server
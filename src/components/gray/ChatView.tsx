@@ -68,6 +68,7 @@ const mapGeminiFileToAttachment = (file: GeminiFileMetadata): ChatAttachment =>
     mime_type: file.mime_type ?? "application/octet-stream",
     display_name: file.display_name ?? file.name,
     size_bytes: file.size_bytes,
+    text: file.text,
   };
 };
 
@@ -164,7 +165,7 @@ export function GrayChatView({ sessionId }: GrayChatViewProps) {
       .uploadGeminiFile(file, file.name)
       .then((uploadedFile: GeminiFileMetadata) => {
         const normalized = mapGeminiFileToAttachment(uploadedFile);
-        if (!normalized.uri) {
+        if (!normalized.uri && !normalized.text) {
           throw new Error("Gemini did not return a reusable file URI.");
         }
         setComposerAttachments((prev) =>
@@ -134,6 +134,7 @@ export interface ChatAttachment {
   mime_type: string;
   display_name?: string;
   size_bytes?: number;
+  text?: string;
 }
 
 export interface ChatMessage {
@@ -193,6 +194,7 @@ export interface GeminiFileMetadata {
   state?: string;
   create_time?: string;
   update_time?: string;
+  text?: string;
 }
 
 export interface UserCreate {